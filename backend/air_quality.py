@@ -0,0 +1,213 @@
+#Air quality for beaches: hourly US AQI (overall and per pollutant) from Open-Meteo,
+#classified into EPA categories with one searchsorted over whole arrays
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from daily_beach_forecast_backend import get_openmeteo, AIR_QUALITY_URL, FORECAST_BATCH_SIZE
+from upstream_stats import track
+
+# Order matters: variables are read back by index
+AQI_VARIABLES = [
+    "us_aqi", "us_aqi_pm2_5", "us_aqi_pm10", "us_aqi_nitrogen_dioxide",
+    "us_aqi_carbon_monoxide", "us_aqi_ozone", "us_aqi_sulphur_dioxide"
+]
+POLLUTANTS = {
+    "us_aqi_pm2_5": "pm2_5",
+    "us_aqi_pm10": "pm10",
+    "us_aqi_nitrogen_dioxide": "nitrogen_dioxide",
+    "us_aqi_carbon_monoxide": "carbon_monoxide",
+    "us_aqi_ozone": "ozone",
+    "us_aqi_sulphur_dioxide": "sulphur_dioxide",
+}
+
+# EPA US AQI categories: upper bound of each category (inclusive)
+US_AQI_BREAKPOINTS = np.array([50, 100, 150, 200, 300], dtype=np.float64)
+US_AQI_CLASSES = np.array([
+    "Good", "Moderate", "Unhealthy for Sensitive Groups",
+    "Unhealthy", "Very Unhealthy", "Hazardous"
+], dtype=object)
+
+AIR_QUALITY_CACHE_TTL = timedelta(minutes=int(os.environ.get("AIR_QUALITY_CACHE_TTL_MIN", 60)))
+_cache = {}  # (lat, lon) -> {'data': <payload>, 'ts': datetime, 'days': int}
+
+# Written by seed_air_quality.py for every beach and read by all workers, so one
+# batch refresh serves the whole app; run it more often than AIR_QUALITY_CACHE_TTL_MIN
+AIR_QUALITY_SNAPSHOT_PATH = os.environ.get(
+    "AIR_QUALITY_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "air_quality_snapshot.json")
+)
+_snapshot = {'entries': {}, 'mtime': None}
+_snapshot_lock = threading.Lock()
+
+
+def classify_us_aqi(values):
+    """US AQI values (any shape) -> category labels; NaN -> None."""
+    values = np.asarray(values, dtype=np.float64)
+    labels = US_AQI_CLASSES[np.searchsorted(US_AQI_BREAKPOINTS, values, side="left")]
+    labels[np.isnan(values)] = None
+    return labels
+
+
+def _coord_key(lat, lon):
+    return (round(float(lat), 4), round(float(lon), 4))
+
+
+def fetch_air_quality(coords, forecast_days=1):
+    """
+    Hourly US AQI variables for many (lat, lon) pairs, one multi-location
+    request per FORECAST_BATCH_SIZE beaches. Returns (beaches x hours) arrays.
+    """
+    columns = {name: [] for name in AQI_VARIABLES}
+    times = []
+    for i in range(0, len(coords), FORECAST_BATCH_SIZE):
+        chunk = coords[i:i + FORECAST_BATCH_SIZE]
+        params = {
+            "latitude": [lat for lat, _ in chunk],
+            "longitude": [lon for _, lon in chunk],
+            "hourly": ",".join(AQI_VARIABLES),
+            "forecast_days": forecast_days,
+            "timezone": "auto",
+        }
+        with track("open-meteo air-quality"):
+            responses = get_openmeteo().weather_api(AIR_QUALITY_URL, params=params)
+
+        for response in responses:
+            hourly = response.Hourly()
+            for idx, name in enumerate(AQI_VARIABLES):
+                columns[name].append(hourly.Variables(idx).ValuesAsNumpy())
+            times.append(np.arange(hourly.Time(), hourly.TimeEnd(), hourly.Interval(), dtype=np.int64))
+
+    hours = min(len(t) for t in times) if times else 0
+    data = {name: np.vstack([v[:hours] for v in values]).astype(np.float64) for name, values in columns.items() if values}
+    data["time"] = np.vstack([t[:hours] for t in times]) if times else np.empty((0, 0), dtype=np.int64)
+    return data
+
+
+def _payload(data, classes, dominant, row):
+    times = np.datetime_as_string(data["time"][row].astype("datetime64[s]"), unit="m", timezone="UTC")
+    hours = []
+    for h in range(len(times)):
+        aqi = data["us_aqi"][row, h]
+        hours.append({
+            "time": str(times[h]),
+            "us_aqi": None if np.isnan(aqi) else round(float(aqi)),
+            "class": classes["us_aqi"][row, h],
+            "dominant_pollutant": dominant[row, h],
+            "pollutants": {
+                short: {
+                    "us_aqi": None if np.isnan(data[name][row, h]) else round(float(data[name][row, h])),
+                    "class": classes[name][row, h]
+                }
+                for name, short in POLLUTANTS.items()
+            }
+        })
+
+    # "current" = the most recent hour that has started
+    now = int(datetime.now(timezone.utc).timestamp())
+    current = max(int(np.searchsorted(data["time"][row], now, side="right")) - 1, 0)
+    return {
+        "current": hours[current] if hours else None,
+        "hours": hours
+    }
+
+
+def _snapshot_key(key):
+    return f"{key[0]},{key[1]}"
+
+
+def _snapshot_entries():
+    """Snapshot entries by "lat,lon", reloaded whenever the file changes."""
+    try:
+        mtime = os.path.getmtime(AIR_QUALITY_SNAPSHOT_PATH)
+    except OSError:
+        return {}
+    if _snapshot['mtime'] != mtime:
+        with _snapshot_lock:
+            if _snapshot['mtime'] != mtime:
+                with open(AIR_QUALITY_SNAPSHOT_PATH) as f:
+                    snapshot = json.load(f)
+                ts = datetime.fromisoformat(snapshot['ts'])
+                _snapshot['entries'] = {
+                    key: {'data': data, 'ts': ts, 'days': snapshot['days']}
+                    for key, data in snapshot['beaches'].items()
+                }
+                _snapshot['mtime'] = mtime
+    return _snapshot['entries']
+
+
+def _write_snapshot(keys, payloads, forecast_days, ts):
+    tmp = f"{AIR_QUALITY_SNAPSHOT_PATH}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({
+            'ts': ts.isoformat(),
+            'days': forecast_days,
+            'beaches': {_snapshot_key(key): data for key, data in zip(keys, payloads)}
+        }, f)
+    os.replace(tmp, AIR_QUALITY_SNAPSHOT_PATH)  # readers never see a half-written file
+
+
+def preload():
+    """Load the snapshot now rather than on first request. Number of beaches in it."""
+    return len(_snapshot_entries())
+
+
+def get_air_quality_batch(coords, forecast_days=1, force_refresh=False):
+    """
+    Classified hourly air quality for many beaches; a list aligned with `coords`.
+    Served from this process's cache, then the shared snapshot, then Open-Meteo.
+    """
+    now = datetime.now(timezone.utc)
+    keys = [_coord_key(lat, lon) for lat, lon in coords]
+
+    def fresh(entry):
+        return entry and now - entry['ts'] <= AIR_QUALITY_CACHE_TTL and entry['days'] >= forecast_days
+
+    missing = []
+    for key in keys:
+        if key in missing:
+            continue
+        if force_refresh:
+            missing.append(key)
+            continue
+        if fresh(_cache.get(key)):
+            continue
+        entry = _snapshot_entries().get(_snapshot_key(key))
+        if fresh(entry):
+            _cache[key] = entry
+        else:
+            missing.append(key)
+
+    if missing:
+        data = fetch_air_quality(missing, forecast_days)
+        classes = {name: classify_us_aqi(data[name]) for name in AQI_VARIABLES}
+
+        # pollutant with the highest sub-index drives the overall AQI
+        stacked = np.stack([data[name] for name in POLLUTANTS])
+        all_nan = np.all(np.isnan(stacked), axis=0)
+        names = np.array(list(POLLUTANTS.values()), dtype=object)
+        dominant = names[np.argmax(np.nan_to_num(stacked, nan=-1.0), axis=0)]
+        dominant[all_nan] = None
+
+        for row, key in enumerate(missing):
+            _cache[key] = {'data': _payload(data, classes, dominant, row), 'ts': now, 'days': forecast_days}
+
+    return [_cache[key]['data'] for key in keys]
+
+
+def get_air_quality(lat, lon, forecast_days=1, force_refresh=False):
+    return get_air_quality_batch([(lat, lon)], forecast_days, force_refresh)[0]
+
+
+def refresh_air_quality(coords, forecast_days=1):
+    """
+    Refresh every given beach with multi-location calls, ignoring the cache, and
+    write the results to the shared snapshot so every worker serves them.
+    """
+    ts = datetime.now(timezone.utc)
+    payloads = get_air_quality_batch(coords, forecast_days, force_refresh=True)
+    _write_snapshot([_coord_key(lat, lon) for lat, lon in coords], payloads, forecast_days, ts)
+    return payloads
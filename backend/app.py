@@ -5,11 +5,21 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from supabase_client import init_supabase
 from rip_current import NOAAMarineData
-from beach_access_points import main as get_beach_access_json
-from tide_conditions import get_tide_prediction_json
-from daily_beach_forecast_backend import get_beach_forecast
-from fwc_redtide import beaches as redtide_beaches
-from datetime import datetime, timedelta, timezone
+from beach_access_points import main as get_beach_access_json, FILTERS as ACCESS_POINT_FILTERS, search_access_points, get_access_points
+from tide_conditions import get_tide_prediction_json, get_tide_series
+from daily_beach_forecast_backend import get_beach_forecast, ForecastColumns
+import red_tide
+from beach_conditions import get_hourly_conditions
+from air_quality import get_air_quality, preload as preload_air_quality
+from beach_ranking import ranking as beach_ranking
+from best_times import plan_best_times
+from zoneinfo import ZoneInfo
+import upstream_stats
+import http_cache
+import parking_recommendations
+import geocoding
+from datetime import date, datetime, timedelta, timezone
+import time
 import uuid
 
 from supabase import create_client
@@ -17,6 +27,7 @@ from dateutil import parser  # more robust datetime parser
 
 TEMP_THRESHOLD = float(os.environ.get("BEACH_TEMP_THRESHOLD", 20.0))
 WIND_THRESHOLD = float(os.environ.get("BEACH_WIND_THRESHOLD", 10.0))
+WATER_QUALITY_HISTORY_DAYS = int(os.environ.get("WATER_QUALITY_HISTORY_DAYS", 90))
 
 supabase = init_supabase()
 noaa = NOAAMarineData()
@@ -24,10 +35,59 @@ noaa = NOAAMarineData()
 app = Flask(__name__)
 CORS(app, supports_credentials=True, origins=["http://localhost", "http://localhost:5173"])  # allows frontend running on a different port to call the backen
 
+def warm():
+    """
+    Load the static datasets and their indexes now instead of on first request.
+    wsgi.py calls this in the gunicorn master (preload_app), so the forked workers
+    share one copy-on-write copy. Opens no SQLite files and keeps no sockets open.
+    """
+    started = time.perf_counter()
+    loaded = {}
+    for name, load in (
+        ("access points", lambda: len(get_access_points())),
+        ("parking recommendations", parking_recommendations.preload),
+        ("red tide", red_tide.preload),
+        ("beach gazetteer", lambda: len(geocoding.load_gazetteer())),
+        ("rip current stations", noaa.load_station_catalog),
+        ("air quality snapshot", preload_air_quality),
+    ):
+        try:
+            loaded[name] = load()
+        except Exception as e:
+            # a dataset that fails here is simply loaded on first use instead
+            print(f"Warm-up: {name} failed: {e}")
+    print(f"Warm-up done in {time.perf_counter() - started:.2f}s: {loaded}")
+    return loaded
+
 @app.route('/')
 def index():
     return "BloomSight API is running!"
 
+@app.before_request
+def start_upstream_tracking():
+    upstream_stats.begin_request()
+
+@app.after_request
+def report_upstream_calls(response):
+    # Breakdown of external API calls made for this request, e.g.
+    # Server-Timing: open-meteo-forecast;dur=182.4, open-meteo-air-quality;dur=95.0
+    calls = upstream_stats.end_request()
+    if calls:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name.replace(' ', '-')};dur={seconds * 1000:.1f}" for name, seconds in calls
+        )
+    return response
+
+# Running totals of upstream calls per API since the worker started
+@app.route('/stats/upstream', methods=['GET'])
+def upstream_call_stats():
+    return jsonify(upstream_stats.totals()), 200
+
+# Hit/miss counters and size of the shared HTTP response cache (this worker)
+@app.route('/stats/http-cache', methods=['GET'])
+def http_cache_stats():
+    return jsonify(http_cache.stats()), 200
+
 def get_current_user():
     auth_header = request.headers.get("Authorization", None)
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -107,6 +167,75 @@ def get_beaches_wrapped():
 #     return jsonify(response.data[0]), 200
 
 
+# Best beaches for a day, e.g. /beaches/best?day=tomorrow&near=27.77,-82.77&radius=30&k=10
+# (bbox=min_lat,min_lon,max_lat,max_lon limits the search to a region)
+@app.route('/beaches/best', methods=['GET'])
+def best_beaches():
+    try:
+        day_arg = request.args.get('day', 'today')
+        today = datetime.now(ZoneInfo("America/New_York")).date()
+        if day_arg == 'today':
+            day = today
+        elif day_arg == 'tomorrow':
+            day = today + timedelta(days=1)
+        else:
+            day = datetime.strptime(day_arg, "%Y-%m-%d").date()
+
+        k = request.args.get('k', default=10, type=int)
+        if not 1 <= k <= 100:
+            raise ValueError("k must be between 1 and 100")
+
+        near = request.args.get('near')
+        near = tuple(float(v) for v in near.split(",")) if near else None
+        radius = request.args.get('radius', type=float)
+        if radius is not None and near is None:
+            raise ValueError("radius requires near=lat,lon")
+
+        bbox = request.args.get('bbox')
+        bbox = tuple(float(v) for v in bbox.split(",")) if bbox else None
+        if (near and len(near) != 2) or (bbox and len(bbox) != 4):
+            raise ValueError("near needs lat,lon and bbox needs min_lat,min_lon,max_lat,max_lon")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
+
+    try:
+        beach_ranking.ensure_loaded(supabase)
+    except Exception as e:
+        app.logger.exception("Failed to load beach ranking:")
+        if not len(beach_ranking.ids):
+            return jsonify({"error": f"Ranking unavailable: {str(e)}"}), 503
+
+    results = beach_ranking.top_k(day, k=k, near=near, radius_miles=radius, bbox=bbox)
+    return jsonify({"day": day.isoformat(), "beaches": results}), 200
+
+# Faceted access point search, e.g.
+# /access-points/search?near=27.77,-82.77&radius=3&lifeguard=1&ada=1&free_parking=1
+# facet=1 requires an amenity, facet=0 excludes it
+@app.route('/access-points/search', methods=['GET'])
+def access_point_search():
+    try:
+        near = request.args.get('near')
+        near = tuple(float(v) for v in near.split(",")) if near else None
+        if near and len(near) != 2:
+            raise ValueError("near needs lat,lon")
+        radius = request.args.get('radius', default=5.0, type=float)
+        if not 0 < radius <= 100:
+            raise ValueError("radius must be between 0 and 100 miles")
+        limit = request.args.get('limit', default=50, type=int)
+        if not 1 <= limit <= 500:
+            raise ValueError("limit must be between 1 and 500")
+
+        filters = [name for name in ACCESS_POINT_FILTERS if request.args.get(name) == '1']
+        exclude = [name for name in ACCESS_POINT_FILTERS if request.args.get(name) == '0']
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
+
+    try:
+        total, results = search_access_points(near, radius, filters, exclude, limit)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"count": total, "access_points": results}), 200
+
 # Manually add a beach to Supabase
 @app.route('/beaches', methods=['POST'])
 def add_beach():
@@ -167,9 +296,22 @@ def beach_parking(mapbox_id):
     beach = beach_data.data
     beach_name = beach.get('name')
 
+    # ?lifeguard=1&ada=1&free_parking=1 ... keep only access points with those amenities
+    filters = [name for name in ACCESS_POINT_FILTERS if request.args.get(name) == '1']
+
     try:
-        # Call the function from beach_access_points.py
-        data = get_beach_access_json(beach_name)
+        lat = lon = None
+        if beach.get('location'):
+            lat_str, lon_str = beach['location'].split(",")
+            lat, lon = float(lat_str.strip()), float(lon_str.strip())
+
+        # Precomputed by seed_parking_recommendations.py; ranked live when filtered,
+        # missing or stale (geocodes the name only without a location)
+        data = None
+        if not filters and lat is not None:
+            data = parking_recommendations.lookup(mapbox_id, beach_name, lat, lon)
+        if data is None:
+            data = get_beach_access_json(beach_name, lat=lat, lon=lon, filters=filters)
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -217,75 +359,208 @@ def tide_prediction(mapbox_id):
     except Exception:
         return jsonify({"error": "Invalid beach location format"}), 400
 
-    # 2) If there's a cached tide_prediction + last_updated, check freshness
+    # 2) Slice the window from the station-level tide store; NOAA is only
+    #    contacted when the station's multi-day block no longer covers it
     tide_cached = beach.get("tide_prediction")
+    try:
+        tide_data = get_tide_prediction_json(lat, lon, beach.get("name"))
+    except Exception as e:
+        app.logger.exception("Failed to fetch tide prediction:")
+        # fallback: return cached tide even if stale, otherwise error
+        if tide_cached:
+            return jsonify(tide_cached), 200
+        return jsonify({"error": f"Failed to fetch tide prediction: {str(e)}"}), 500
+
+    # 3) Keep a snapshot in the DB as the outage fallback, refreshed every 12 hours
     last_updated_str = beach.get("last_updated")
+    snapshot_fresh = False
     if tide_cached and last_updated_str:
         try:
-            last_updated = parse_iso8601_lenient(last_updated_str)
-            age = datetime.now(timezone.utc) - last_updated
-            # consider cached tides fresh for 12 hours
-            if age < timedelta(hours=12):
-                return jsonify(tide_cached), 200
+            age = datetime.now(timezone.utc) - parse_iso8601_lenient(last_updated_str)
+            snapshot_fresh = age < timedelta(hours=12)
         except Exception as e:
-            # log parse failure (optional) and continue to fetch new data
             app.logger.debug(f"Could not parse last_updated '{last_updated_str}': {e}")
 
-    # 3) fetch new tide prediction (your existing function)
+    if not snapshot_fresh:
+        try:
+            # save back to DB (write microsecond-precision UTC ISO)
+            supabase.table("beaches").update({
+                "tide_prediction": tide_data,
+                "last_updated": datetime.now(timezone.utc).isoformat(timespec="microseconds")
+            }).eq("mapbox_id", mapbox_id).execute()
+        except Exception:
+            app.logger.exception("Failed to store tide snapshot:")
+
+    return jsonify(tide_data), 200
+
+def _parse_query_time(value, default):
+    if not value:
+        return default
+    dt = parser.isoparse(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+# Tide series for arbitrary windows, e.g. ?from=2025-08-01&to=2025-08-08&interval=6m&max_points=400
+@app.route("/beaches/<string:mapbox_id>/tides", methods=["GET"])
+def beach_tides(mapbox_id):
+    beach_res = supabase.table("beaches").select("location").eq("mapbox_id", mapbox_id).single().execute()
+    if not beach_res.data:
+        return jsonify({"error": "Beach not found"}), 404
+
     try:
-        tide_data = get_tide_prediction_json(lat, lon, beach.get("name"))
-        # save back to DB (write microsecond-precision UTC ISO)
-        supabase.table("beaches").update({
-            "tide_prediction": tide_data,
-            "last_updated": datetime.now(timezone.utc).isoformat(timespec="microseconds")
-        }).eq("mapbox_id", mapbox_id).execute()
+        lat_str, lon_str = beach_res.data["location"].split(",")
+        lat = float(lat_str.strip())
+        lon = float(lon_str.strip())
+    except Exception:
+        return jsonify({"error": "Invalid beach location format"}), 400
+
+    try:
+        start = _parse_query_time(request.args.get("from"), datetime.now(timezone.utc))
+        end = _parse_query_time(request.args.get("to"), start + timedelta(days=1))
+        interval = request.args.get("interval", "h")
+        max_points = request.args.get("max_points", type=int)
+        if max_points is not None and max_points < 3:
+            raise ValueError("max_points must be at least 3")
+    except (ValueError, OverflowError) as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
 
-        return jsonify(tide_data), 200
+    try:
+        return jsonify(get_tide_series(lat, lon, start, end, interval, max_points)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.exception("Failed to fetch tide prediction:")
-        # fallback: return cached tide even if stale, otherwise error
-        if tide_cached:
-            return jsonify(tide_cached), 200
-        return jsonify({"error": f"Failed to fetch tide prediction: {str(e)}"}), 500
+        app.logger.exception("Failed to fetch tide series:")
+        return jsonify({"error": f"Failed to fetch tides: {str(e)}"}), 500
 
 #For getting weather forecast data
 @app.route('/beaches/<string:mapbox_id>/weather-forecast', methods=['GET'])
 def beach_weather_forecast(mapbox_id):
-    forecast_data = supabase.table('beaches').select('forecast, last_updated').eq('mapbox_id', mapbox_id).single().execute()
+    # ?format=columnar returns one array per variable instead of one dict per day
+    fmt = request.args.get('format', 'daily')
+    if fmt not in ('daily', 'columnar'):
+        return jsonify({'error': "format must be 'daily' or 'columnar'"}), 400
+
+    def render(forecast):
+        if not isinstance(forecast, ForecastColumns):
+            forecast = ForecastColumns.from_json(forecast)
+        return forecast.to_columnar() if fmt == 'columnar' else forecast.to_records()
+
+    forecast_data = supabase.table('beaches').select('forecast, last_updated, location').eq('mapbox_id', mapbox_id).single().execute()
 
     if not forecast_data.data:
         return jsonify({'error': 'Beach not found'}), 404
 
+    stored = forecast_data.data.get('forecast')
     if forecast_data.data.get('last_updated'):
         last_updated = parse_iso8601_lenient(forecast_data.data['last_updated'])
         age = datetime.now(timezone.utc) - last_updated
         # Changed from 12 hours to 1 hour
-        if age < timedelta(hours=1) and forecast_data.data.get('forecast'):
-            return jsonify(forecast_data.data['forecast']), 200
+        if age < timedelta(hours=1) and stored:
+            return jsonify(render(stored)), 200
 
-    # Retrieve full beach info
-    beach_data = supabase.table('beaches').select('*').eq('mapbox_id', mapbox_id).single().execute()
-    if not beach_data.data:
-        return jsonify({'error': 'Beach not found'}), 404
-
-    beach = beach_data.data
-    lat_str, lon_str = beach['location'].split(",")
+    lat_str, lon_str = forecast_data.data['location'].split(",")
     lat, lon = float(lat_str.strip()), float(lon_str.strip())
 
     try:
         forecasts = get_beach_forecast(lat, lon)
 
         supabase.table('beaches').update({
-            'forecast': forecasts,
+            'forecast': forecasts.to_columnar(),
             'last_updated': datetime.now(timezone.utc).isoformat()
         }).eq('mapbox_id', mapbox_id).execute()
+        beach_ranking.update(mapbox_id, lat, lon, forecasts)
 
-        return jsonify(forecasts), 200
+        return jsonify(render(forecasts)), 200
     except Exception as e:
         # Fall back to stale forecast if available
-        if forecast_data.data.get('forecast'):
-            return jsonify(forecast_data.data['forecast']), 200
+        if stored:
+            return jsonify(render(stored)), 200
         return jsonify({'error': f'Failed to fetch forecast: {str(e)}'}), 500
+
+# Hourly beach conditions (temperature, rain, wind, UV, ... classes) for the next `days` days
+@app.route('/beaches/<string:mapbox_id>/hourly-conditions', methods=['GET'])
+def beach_hourly_conditions(mapbox_id):
+    beach_data = supabase.table('beaches').select('location').eq('mapbox_id', mapbox_id).single().execute()
+    if not beach_data.data:
+        return jsonify({'error': 'Beach not found'}), 404
+
+    try:
+        lat_str, lon_str = beach_data.data['location'].split(",")
+        lat, lon = float(lat_str.strip()), float(lon_str.strip())
+    except Exception:
+        return jsonify({'error': 'Invalid beach location format'}), 400
+
+    days = request.args.get('days', default=1, type=int)
+    if not 1 <= days <= 7:
+        return jsonify({'error': 'days must be between 1 and 7'}), 400
+    force = request.args.get('force', default='0')
+
+    try:
+        result = get_hourly_conditions(lat, lon, forecast_days=days, force_refresh=(force == '1'))
+        return jsonify({**result, 'hours': result['hours'][:days * 24]}), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch hourly conditions: {str(e)}'}), 500
+
+# Hourly US AQI with per-pollutant sub-indices and EPA categories
+@app.route('/beaches/<string:mapbox_id>/air-quality', methods=['GET'])
+def beach_air_quality(mapbox_id):
+    beach_data = supabase.table('beaches').select('location').eq('mapbox_id', mapbox_id).single().execute()
+    if not beach_data.data:
+        return jsonify({'error': 'Beach not found'}), 404
+
+    try:
+        lat_str, lon_str = beach_data.data['location'].split(",")
+        lat, lon = float(lat_str.strip()), float(lon_str.strip())
+    except Exception:
+        return jsonify({'error': 'Invalid beach location format'}), 400
+
+    days = request.args.get('days', default=1, type=int)
+    if not 1 <= days <= 5:
+        return jsonify({'error': 'days must be between 1 and 5'}), 400
+    force = request.args.get('force', default='0')
+
+    try:
+        result = get_air_quality(lat, lon, forecast_days=days, force_refresh=(force == '1'))
+        return jsonify({**result, 'hours': result['hours'][:days * 24]}), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch air quality: {str(e)}'}), 500
+
+# Best windows to visit over the next few days, scored from cached weather, tide, rip and red tide data
+@app.route('/beaches/<string:mapbox_id>/best-times', methods=['GET'])
+def beach_best_times(mapbox_id):
+    beach_data = supabase.table('beaches').select('name, location').eq('mapbox_id', mapbox_id).single().execute()
+    if not beach_data.data:
+        return jsonify({'error': 'Beach not found'}), 404
+
+    try:
+        lat_str, lon_str = beach_data.data['location'].split(",")
+        lat, lon = float(lat_str.strip()), float(lon_str.strip())
+    except Exception:
+        return jsonify({'error': 'Invalid beach location format'}), 400
+
+    days = request.args.get('days', default=3, type=int)
+    window = request.args.get('window', default=2, type=int)
+    top = request.args.get('top', default=5, type=int)
+    if not (1 <= days <= 7 and 1 <= window <= 12 and 1 <= top <= 20):
+        return jsonify({'error': 'Expected days 1-7, window 1-12 and top 1-20'}), 400
+
+    # rip current risk only if it is already cached; the full assessment is too slow to run here
+    rip = noaa.get_cached_risk(lat, lon)
+    red_tide_status = red_tide.get_status(mapbox_id, lat, lon)
+
+    try:
+        plan = plan_best_times(
+            lat, lon, days=days, window_hours=window, top=top,
+            rip_risk=rip.get('risk_level') if rip else None,
+            red_tide_risk=red_tide_status['karena_brevis_risk'] if red_tide_status else None
+        )
+        if plan is None:
+            # filled by the hourly conditions endpoint; planning never fetches a forecast itself
+            return jsonify({'error': 'Hourly forecast not ready for this beach, try again shortly'}), 503
+        return jsonify(plan), 200
+    except Exception as e:
+        app.logger.exception("Failed to plan best times:")
+        return jsonify({'error': f'Failed to plan best times: {str(e)}'}), 500
+
 #get water quality/ red tide/ karena brevis abundance
 @app.route('/beaches/<string:mapbox_id>/water-quality', methods=['GET'])
 def beach_water_quality(mapbox_id):
@@ -300,34 +575,57 @@ def beach_water_quality(mapbox_id):
     lat_str, lon_str = location.split(",")
     lat = float(lat_str.strip())
     lon = float(lon_str.strip())
-    name = beach.get('name')
 
-    # Find the FWC red tide data from the local beaches list
-    fwc_beach = next((b for b in redtide_beaches if b["name"] == name), None)
-    if not fwc_beach:
+    # Precomputed by seed_red_tide.py from the FWC samples near this beach,
+    # or interpolated from the red tide raster when no sample site is in range
+    status = red_tide.get_status(mapbox_id, lat, lon)
+    if not status:
         return jsonify({'error': 'No water quality data for this beach'}), 404
 
-    # Map abundance to numeric risk score
-    abundance = fwc_beach.get("abundance", "not present").lower()
-    if abundance == "high":
-        risk_score = 5
-    elif abundance == "medium":
-        risk_score = 3
-    elif abundance == "low":
-        risk_score = 1
-    else:
-        risk_score = 0  # not present / safe
-
     # Construct JSON response
     water_quality = {
-        "karena_brevis_risk": risk_score,
-        "abundance": fwc_beach.get("abundance", "not present"),
+        "karena_brevis_risk": status["karena_brevis_risk"],
+        "abundance": status["abundance"],
+        "cells_per_liter": status["cells_per_liter"],
+        "sample_site": status["site"],
+        "sample_distance_miles": status["distance_miles"],
+        "sample_date": status["sample_date"],
+        "estimated": status["estimated"],
         "latitude": lat,
         "longitude": lon
     }
 
     return jsonify(water_quality), 200
 
+# Weekly red tide trend from the FWC sample sites near a beach, e.g. ?start=2025-06-01&end=2025-09-30
+@app.route('/beaches/<string:mapbox_id>/water-quality/history', methods=['GET'])
+def beach_water_quality_history(mapbox_id):
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') \
+            else end - timedelta(days=WATER_QUALITY_HISTORY_DAYS)
+        if start > end:
+            raise ValueError("start must not be after end")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
+
+    beach_data = supabase.table('beaches').select('location').eq('mapbox_id', mapbox_id).single().execute()
+    if not beach_data.data:
+        return jsonify({'error': 'Beach not found'}), 404
+    lat_str, lon_str = beach_data.data['location'].split(",")
+    lat = float(lat_str.strip())
+    lon = float(lon_str.strip())
+
+    epoch = date(1970, 1, 1)
+    sites, weeks = red_tide.history(lat, lon, (start - epoch).days, (end - epoch).days)
+    return jsonify({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "radius_miles": red_tide.RED_TIDE_RADIUS_MILES,
+        "sites": sites,
+        "weeks": weeks,
+    }), 200
+
 @app.route("/beaches/<string:mapbox_id>/pictures", methods=["POST"])
 def add_picture(mapbox_id):
     user = get_current_user()
@@ -1,18 +1,40 @@
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-import pandas as pd
+import hashlib
+import os
+import threading
+
+import numpy as np
+# pandas loads only while the CSV table is built
+
+from spatial import GridIndex
+import geocoding
+
+ACCESS_POINTS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fl_beach_access_points.csv")
+MISSING_FEE = 999  # Missing data penalty
+
+# Access-point filters: query name -> CSV column that must be "Yes"
+# (plus free_parking: regular parking whose PARKING_FEE is "No"; a 0 PARKING_FEE_AMOUNT
+# also means no parking or an unknown fee, so it is not used)
+FACETS = {
+    "parking": "REGULAR_PARKING",
+    "lifeguard": "LIFEGUARD",
+    "restroom": "RESTROOM",
+    "shower": "SHOWER",
+    "ada": "ADA_ACCESSIBLE",
+    "ada_parking": "ADA_PARKING",
+    "boardwalk": "BOARDWALK_TRAIL",
+}
+FILTERS = list(FACETS) + ["free_parking"]
 
 # ----------------------
 # Get lat/lon of a beach
 # ----------------------
 def get_beach_location(beach_name):
-    geolocator = Nominatim(user_agent="beach_name_locator")
-    beach_location = geolocator.geocode(beach_name)
+    beach_location = geocoding.geocode(beach_name)
 
     if not beach_location:
         raise ValueError(f"Could not find location for {beach_name}")
 
-    return beach_location.latitude, beach_location.longitude, beach_location.address
+    return beach_location
 
 # ----------------------
 # Convert miles to walking time (minutes)
@@ -23,134 +45,289 @@ def miles_to_walk_time(miles):
     return seconds / 60  # minutes
 
 # ----------------------
-# Scoring function
+# Address from the dataset, e.g.
+# "Beach Park, 104th Ave. & Gulf Blvd., Treasure Island, Pinellas County, FL"
 # ----------------------
-def score_access_point(coord, dist, beach_access_points):
-    score = 0
+def _format_address(access_name, location_address, city, county):
+    access_name, location_address = access_name.strip(), location_address.strip()
+    if not access_name and not location_address:
+        return ""  # nothing street-level to show; caller falls back to reverse geocoding
+
+    if location_address.startswith(access_name):
+        access_name = ""  # "103rd Avenue" + "103rd Avenue, 10300 Gulf Blvd."
+
+    parts = []
+    for part in (access_name, location_address, city.strip()):
+        if part and part not in parts:
+            parts.append(part)
+    if county.strip():
+        parts.append(f"{county.strip()} County")
+    parts.append("FL")
+    return ", ".join(parts)
+
+# ----------------------
+# Access point table (loaded once, column-wise)
+# ----------------------
+class AccessPointTable:
+    """
+    The access-point CSV held as typed numpy columns. Row ids are positions in
+    these arrays; `row_of_site` maps SITE_ID -> row id. `keys` is a stable
+    identity per row (SITE_ID, or the coordinates when it has none) and
+    `row_hash` a content fingerprint, so a new CSV can be diffed row by row.
+    """
+
+    def __init__(self, frame):
+        import pandas as pd
+        if "LAT_LON_COORDS" not in frame.columns:
+            frame["LAT_LON_COORDS"] = frame["Y_LATITUDE"].astype(str) + ", " + frame["X_LONGITUDE"].astype(str)
 
-    # Distance score
-    if dist <= 0.5:
-        score += 40
-    elif dist <= 1.0:
-        score += 30
-    elif dist <= 2.0:
-        score += 10
+        # parse "lat, lon" once; unparseable rows are dropped
+        parts = frame["LAT_LON_COORDS"].astype(str).str.split(",", n=1, expand=True)
+        lat = pd.to_numeric(parts[0].str.strip(), errors="coerce")
+        lon = pd.to_numeric(parts[1].str.strip(), errors="coerce") if parts.shape[1] > 1 else lat * np.nan
+        valid = (lat.notna() & lon.notna()).to_numpy()
+        frame = frame[valid].reset_index(drop=True)
+
+        self.lat = lat[valid].to_numpy(dtype=np.float64)
+        self.lon = lon[valid].to_numpy(dtype=np.float64)
+        self.coords = frame["LAT_LON_COORDS"].to_numpy(dtype=object)
+        self.regular_parking = (frame["REGULAR_PARKING"] == "Yes").to_numpy()
+        # non-numeric counts such as "100+" score as 0 spaces
+        spaces = pd.to_numeric(frame["NUMBER_OF_SPACES"], errors="coerce")
+        self.spaces = spaces.where(spaces == spaces.round(), 0).fillna(0).to_numpy(dtype=np.int32)
+        self.fee = pd.to_numeric(frame["PARKING_FEE_AMOUNT"], errors="coerce").fillna(MISSING_FEE).to_numpy(dtype=np.float64)
+        self.text = {
+            col: frame[col].fillna("").astype(str).to_numpy(dtype=object)
+            for col in ("COUNTY", "BEACH_OR_CITY_NAME", "ACCESS_NAME", "LOCATION_ADDRESS", "SITE_ID")
+            if col in frame.columns
+        }
+        self.addresses = np.array([
+            _format_address(*parts) for parts in zip(
+                *(self.text.get(col, np.full(len(frame), "", dtype=object))
+                  for col in ("ACCESS_NAME", "LOCATION_ADDRESS", "BEACH_OR_CITY_NAME", "COUNTY"))
+            )
+        ], dtype=object)
+        self.row_of_site = {site: row for row, site in enumerate(self.text.get("SITE_ID", [])) if site}
+        self.keys = np.where(self.text["SITE_ID"] != "", self.text["SITE_ID"], self.coords) \
+            if "SITE_ID" in self.text else self.coords.copy()
+        self.row_of_key = {key: row for row, key in enumerate(self.keys)}
+        self.row_hash = pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
+        self.digest = hashlib.sha1(np.sort(self.row_hash).tobytes()).hexdigest()
+        self.facets = {name: (frame[col] == "Yes").to_numpy() for name, col in FACETS.items() if col in frame.columns}
+        no_fee = frame["PARKING_FEE"].fillna("").astype(str).str.strip().str.lower().str.startswith("no") \
+            if "PARKING_FEE" in frame.columns else np.zeros(len(frame), dtype=bool)
+        self.facets["free_parking"] = self.regular_parking & np.asarray(no_fee, dtype=bool)
+        # the same facets packed 8 rows per byte, so multi-facet queries AND a few hundred bytes
+        self.facet_bits = {name: np.packbits(flags) for name, flags in self.facets.items()}
+        self.index = GridIndex(self.lat, self.lon)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def facet_mask(self, filters, exclude=None):
+        """
+        Rows that have every facet in `filters` and none in `exclude`, or None
+        when nothing is filtered. Intersects the packed bitsets, then unpacks once.
+        """
+        bits = None
+        for name, negate in [(f, False) for f in filters or ()] + [(f, True) for f in exclude or ()]:
+            if name not in self.facet_bits:
+                raise ValueError(f"Unknown access point filter: {name}")
+            facet = ~self.facet_bits[name] if negate else self.facet_bits[name]
+            bits = facet if bits is None else bits & facet
+        if bits is None:
+            return None
+        return np.unpackbits(bits, count=len(self)).astype(bool)
+
+    @classmethod
+    def from_csv(cls, path=ACCESS_POINTS_CSV):
+        import pandas as pd
+        return cls(pd.read_csv(path))
+
+
+_table = None
+_table_lock = threading.Lock()
+
+def get_access_points():
+    """The shared AccessPointTable, read from disk on first use only."""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = AccessPointTable.from_csv()
+    return _table
+
+# ----------------------
+# Scoring function
+# ----------------------
+def score_access_points(table, rows, dist):
+    """Scores for the given row ids (all at once) and their distances in miles."""
+    dist = np.asarray(dist, dtype=np.float64)
+    score = np.select([dist <= 0.5, dist <= 1.0, dist <= 2.0], [40.0, 30.0, 10.0], 0.0)
 
     # Parking availability
-    avail = beach_access_points.loc[
-        beach_access_points["LAT_LON_COORDS"] == coord, "REGULAR_PARKING"
-    ].values[0]
-    if avail == "Yes":
-        score += 20
+    score += np.where(table.regular_parking[rows], 20.0, 0.0)
 
     # Number of spaces
-    num_spaces = beach_access_points.loc[
-        beach_access_points["LAT_LON_COORDS"] == coord, "NUMBER_OF_SPACES"
-    ].values[0]
-    try:
-        num_spaces = int(num_spaces)
-    except:
-        num_spaces = 0
-    score += min(num_spaces, 50) / 50 * 20
+    score += np.minimum(table.spaces[rows], 50) / 50 * 20
 
     # Parking fee
-    parking_fee = beach_access_points.loc[
-        beach_access_points["LAT_LON_COORDS"] == coord, "PARKING_FEE_AMOUNT"
-    ].values[0]
-    try:
-        parking_fee = float(parking_fee)
-    except:
-        parking_fee = 999  # Missing data penalty
-
-    if parking_fee == 0:
-        score += 20
-    elif parking_fee <= 10:
-        score += 10
+    fee = table.fee[rows]
+    score += np.select([fee == 0, fee <= 10], [20.0, 10.0], 0.0)
 
-    return score, parking_fee
+    return score, fee
 
 # ----------------------
 # Ranking function
 # ----------------------
-def rank_access_points(beach_lat, beach_lon, beach_access_points, max_distance_miles=2.0, expand_if_none=True):
-    scores = {}
-    beach_coord = (beach_lat, beach_lon)
+def rank_access_points(beach_lat, beach_lon, table=None, max_distance_miles=2.0, expand_if_none=True,
+                       limit=5, filters=None):
+    """
+    Top `limit` access points within the radius as (row ids, scores, distances, fees),
+    restricted to rows having every facet in `filters`. If none are in range,
+    the `limit` nearest matching access points are ranked instead.
+    """
+    table = table or get_access_points()
+    mask = table.facet_mask(filters)
+
+    # ✅ Only access points within the distance limit (grid cells + haversine)
+    rows, dist = table.index.query_radius(beach_lat, beach_lon, max_distance_miles, mask=mask)
 
-    for coord in beach_access_points["LAT_LON_COORDS"]:
-        try:
-            lat, lon = coord.split(", ")
-            local_coord = (float(lat), float(lon))
-        except:
-            continue  # skip invalid coords
+    if not len(rows) and expand_if_none:
+        rows, dist = table.index.nearest(beach_lat, beach_lon, limit, mask=mask)
 
-        distance_miles = geodesic(beach_coord, local_coord).miles
+    scores, fees = score_access_points(table, rows, dist)
 
-        # ✅ Only keep access points within the distance limit
-        if distance_miles > max_distance_miles:
-            continue
+    # Sort by score (highest first, file order on ties), keep top `limit`
+    order = np.lexsort((rows, -scores))[:limit]
+    return rows[order], scores[order], dist[order], fees[order]
 
-        score, parking_fee = score_access_point(coord, distance_miles, beach_access_points)
-        scores[coord] = (score, distance_miles, parking_fee)
+def rank_access_points_many(lats, lons, table=None, max_distance_miles=2.0, limit=5):
+    """
+    rank_access_points for many beaches in one pass: every (beach, access point)
+    pair within the radius comes from the grid index at once and is scored
+    together. Returns (rows, scores, dists) arrays shaped (beaches, limit),
+    padded with -1 / NaN; beaches with nothing in range get their nearest points.
+    """
+    table = table or get_access_points()
+    n = len(lats)
+    out_rows = np.full((n, limit), -1, dtype=np.int64)
+    out_scores = np.full((n, limit), np.nan)
+    out_dists = np.full((n, limit), np.nan)
 
-    # If none found and expand_if_none is True → expand radius
-    if not scores and expand_if_none:
-        return rank_access_points(beach_lat, beach_lon, beach_access_points, max_distance_miles * 2)
+    beach, rows, dist = table.index.pairs_within(lats, lons, max_distance_miles)
+    scores, _ = score_access_points(table, rows, dist)
 
-    # Sort by score (highest first), keep top 5
-    sorted_scores = dict(sorted(scores.items(), key=lambda x: x[1][0], reverse=True)[:5])
-    return sorted_scores
+    # per beach: highest score first, file order on ties; keep the first `limit`
+    order = np.lexsort((rows, -scores, beach))
+    beach, rows, dist, scores = beach[order], rows[order], dist[order], scores[order]
+    group_start = np.searchsorted(beach, beach, side="left")
+    rank = np.arange(len(beach)) - group_start
+    keep = rank < limit
+    out_rows[beach[keep], rank[keep]] = rows[keep]
+    out_scores[beach[keep], rank[keep]] = scores[keep]
+    out_dists[beach[keep], rank[keep]] = dist[keep]
+
+    for b in np.flatnonzero(out_rows[:, 0] < 0):
+        r, s, d, _ = rank_access_points(lats[b], lons[b], table, max_distance_miles, limit=limit)
+        out_rows[b, :len(r)], out_scores[b, :len(r)], out_dists[b, :len(r)] = r, s, d
+
+    return out_rows, out_scores, out_dists
 
 # ----------------------
-# Main function (return JSON)
+# Faceted search
 # ----------------------
-def main(beach_name="Treasure Island Beach Florida"):
-    # Load dataset
-    beach_access_points = pd.read_csv("fl_beach_access_points.csv")
+def search_access_points(near=None, radius_miles=5.0, filters=None, exclude=None, limit=50, table=None):
+    """
+    Access points having every facet in `filters` and none in `exclude`, optionally
+    within `radius_miles` of `near` (lat, lon), closest first. The facet bitsets
+    are intersected first so only matching rows reach the spatial filter.
+    Returns (total matches, list of result dicts up to `limit`).
+    """
+    table = table or get_access_points()
+    mask = table.facet_mask(filters, exclude)
 
-    # If coords aren't in string format, build them
-    if "LAT_LON_COORDS" not in beach_access_points.columns:
-        beach_access_points["LAT_LON_COORDS"] = (
-            beach_access_points["Y_LATITUDE"].astype(str) + ", " +
-            beach_access_points["X_LONGITUDE"].astype(str)
-        )
+    if near is not None:
+        rows, dist = table.index.query_radius(near[0], near[1], radius_miles, mask=mask)
+        order = np.lexsort((rows, dist))
+        rows, dist = rows[order], dist[order]
+    else:
+        rows = np.arange(len(table)) if mask is None else np.flatnonzero(mask)
+        dist = None
 
-    # Get beach location
-    beach_lat, beach_lon, beach_address = get_beach_location(beach_name)
-
-    # Rank recommendations (default: only within 2 miles, expands if none found)
-    top_recommendations = rank_access_points(beach_lat, beach_lon, beach_access_points, max_distance_miles=2.0)
+    results = []
+    for i, row in enumerate(rows[:limit]):
+        fee = table.fee[row]
+        results.append({
+            "site_id": table.text.get("SITE_ID", table.keys)[row] or None,
+            "name": table.text.get("ACCESS_NAME", table.coords)[row],
+            "address": table.addresses[row] or None,
+            "coordinates": table.coords[row],
+            "distance_miles": None if dist is None else round(float(dist[i]), 2),
+            "parking_fee": None if fee == MISSING_FEE else float(fee),
+            "parking_spaces": int(table.spaces[row]),
+            "amenities": sorted(name for name, flags in table.facets.items() if flags[row]),
+        })
+    return len(rows), results
 
-    # Build JSON result
-    geolocator = Nominatim(user_agent="beach_name_locator")
+# ----------------------
+# Main function (return JSON)
+# ----------------------
+def build_response(table, beach_name, beach_address, rows, scores, dists, filters=None):
+    """The /parking-spots JSON for already-ranked access points."""
     results = []
 
-    for coord, (score, dist, fee) in top_recommendations.items():
-        try:
-            location = geolocator.reverse(coord)
-            address = location.address if location else "Unknown location"
-        except:
-            address = "Unknown location"
+    for row, score, dist in zip(rows, scores, dists):
+        coord = table.coords[row]
+        address = table.addresses[row]
+        if not address:
+            try:
+                address = geocoding.reverse(table.lat[row], table.lon[row]) or "Unknown location"
+            except:
+                address = "Unknown location"
 
         walk_time_min = miles_to_walk_time(dist)
-        fee_val = 0 if fee == 999 else fee
+        fee = table.fee[row]
+        fee_val = 0 if fee == MISSING_FEE else float(fee)
         fee_str = "Free" if fee_val == 0 else f"${fee_val:.2f}"
 
         results.append({
             "address": address,
             "coordinates": coord,
-            "distance_miles": round(dist, 2),
-            "walk_time_min": round(walk_time_min, 1),
+            "distance_miles": round(float(dist), 2),
+            "walk_time_min": round(float(walk_time_min), 1),
             "parking_fee": fee_val,
             "parking_fee_str": fee_str,
-            "score": round(score, 1)
+            "score": round(float(score), 1)
         })
 
     return {
         "beach_name": beach_name,
         "beach_address": beach_address,
+        "filters": sorted(filters or []),
         "top_access_points": results
     }
 
+def main(beach_name="Treasure Island Beach Florida", lat=None, lon=None, filters=None):
+    """
+    Parking/access recommendations for a beach. Pass the beach's stored
+    coordinates when known; the name is only geocoded (through the geocode
+    cache) when they're missing, and then also supplies the address.
+    """
+    table = get_access_points()
+
+    # Get beach location
+    if lat is None or lon is None:
+        beach_lat, beach_lon, beach_address = get_beach_location(beach_name)
+    else:
+        # beaches have no stored address; show the name rather than raw coordinates
+        beach_lat, beach_lon, beach_address = float(lat), float(lon), beach_name
+
+    # Rank recommendations (default: only within 2 miles, expands if none found)
+    rows, scores, dists, _ = rank_access_points(beach_lat, beach_lon, table, max_distance_miles=2.0, filters=filters)
+
+    return build_response(table, beach_name, beach_address, rows, scores, dists, filters)
+
 # Example usage
 if __name__ == "__main__":
     import json
@@ -0,0 +1,319 @@
+#Hourly beach conditions: classifies Open-Meteo hourly weather into beach friendly
+#labels (temperature, rain, wind, gusts, UV, clouds, humidity, overall) for whole
+#arrays of hours, and optionally many beaches at once
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from daily_beach_forecast_backend import get_openmeteo, FORECAST_URL, FORECAST_BATCH_SIZE
+from upstream_stats import track
+
+# Order matters: variables are read back by index
+HOURLY_VARIABLES = [
+    "temperature_2m", "weather_code", "wind_speed_10m", "wind_gusts_10m", "cloud_cover",
+    "rain", "precipitation_probability", "relative_humidity_2m", "uv_index", "is_day"
+]
+
+# In-memory cache of classified hours per beach coordinate
+HOURLY_CACHE_TTL = timedelta(minutes=int(os.environ.get("HOURLY_CACHE_TTL_MIN", 60)))
+_cache = {}  # (lat, lon) -> {'data': <payload>, 'arrays': <raw rows>, 'overall': <labels>, 'ts': datetime, 'days': int}
+
+
+# -----------------------------
+# Vectorized classifier
+# -----------------------------
+class BeachClassModel:
+    """
+    Beach condition classifier working on numpy arrays. Every input can be an
+    array of any shape (hours, or beaches x hours) and every classify_* method
+    returns an array of labels with that same shape.
+    Temperatures are in °C, wind speeds in km/h.
+    """
+
+    def __init__(self, temperature, precipitation, rain, wind_speed, wind_gusts, is_day, cloud_cover, weather_code, humidity, uv_index):
+        self.temperature = np.asarray(temperature, dtype=np.float64)
+        self.precipitation = np.asarray(precipitation, dtype=np.float64)
+        self.rain = np.asarray(rain, dtype=np.float64)
+        self.wind_speed = np.asarray(wind_speed, dtype=np.float64)
+        self.wind_gusts = np.asarray(wind_gusts, dtype=np.float64)
+        self.is_day = np.asarray(is_day, dtype=np.float64)
+        self.cloud_cover = np.asarray(cloud_cover, dtype=np.float64)
+        self.weather_code = np.asarray(weather_code, dtype=np.float64)
+        self.humidity = np.asarray(humidity, dtype=np.float64)
+        self.uv_index = np.asarray(uv_index, dtype=np.float64)
+
+    def classify_beach_temp(self):
+        t = self.temperature
+        return np.select(
+            [t > 32, t > 22, t > 18, t > 10],
+            ["Hot", "Good", "Acceptable", "Cold"],
+            default="Very Cold"
+        )
+
+    def classify_beach_rain(self):
+        r = self.rain
+        return np.select([r > 5, r > 1], ["Heavy Rain", "Light Rain"], default="Dry")
+
+    def classify_beach_precipitation_chance(self):
+        p = self.precipitation
+        return np.select(
+            [p > 80, p > 60, p > 40, p > 20],
+            ["Very High Chance", "High Chance", "Moderate Chance", "Low Chance"],
+            default="Very Low Chance"
+        )
+
+    def classify_beach_wind(self):
+        w = self.wind_speed
+        return np.select(
+            [w > 13, w > 9, w > 2],
+            ["Very Strong Winds", "Windy", "Nice Breeze"],
+            default="Calm"
+        )
+
+    def classify_beach_wind_gusts(self):
+        g = self.wind_gusts
+        return np.select(
+            [g > 20, g > 15, g > 10],
+            ["Dangerous Gusts", "Strong Gusts", "Moderate Gusts"],
+            default="Light Gusts"
+        )
+
+    def classify_beach_humidity(self):
+        h = self.humidity
+        return np.select(
+            [h > 80, h > 65, h > 45],
+            ["Very Humid", "Humid", "Comfortable"],
+            default="Dry"
+        )
+
+    def classify_beach_uv_index(self):
+        uv = self.uv_index
+        return np.select(
+            [uv >= 11, uv >= 8, uv >= 6, uv >= 3, uv >= 1],
+            [
+                "Extreme (Dangerous)", "Very High (Protection needed)", "High (Protection recommended)",
+                "Moderate (Some protection)", "Low (Minimal risk)"
+            ],
+            default="None"
+        )
+
+    def classify_beach_cloud_coverage(self):
+        c = self.cloud_cover
+        return np.select(
+            [(c >= 0) & (c < 20), (c >= 20) & (c < 50), (c >= 50) & (c < 80)],
+            ["Mostly Clear", "Partly Cloudy", "Cloudy"],
+            default="Overcast"
+        )
+
+    def classify_beach_weather_code(self):
+        code = self.weather_code
+        return np.select(
+            [
+                code == 0, code == 1, code == 2, code == 3,
+                np.isin(code, [45, 48]), np.isin(code, [51, 53, 55]),
+                np.isin(code, [61, 63, 65]), np.isin(code, [71, 73, 75])
+            ],
+            [
+                "Clear Sky", "Mainly Clear", "Partly Cloudy", "Overcast",
+                "Fog", "Drizzle", "Rain Showers", "Snow Showers"
+            ],
+            default="Unknown Weather Code"
+        )
+
+    def classify_beach_conditions(self):
+        return {
+            "Temperature": self.classify_beach_temp(),
+            "Rain": self.classify_beach_rain(),
+            "Rain Chance": self.classify_beach_precipitation_chance(),
+            "Wind": self.classify_beach_wind(),
+            "Wind Gusts": self.classify_beach_wind_gusts(),
+            "Cloud Cover": self.classify_beach_cloud_coverage(),
+            "Weather Code": self.classify_beach_weather_code(),
+            "Humidity": self.classify_beach_humidity(),
+            "UV Index": self.classify_beach_uv_index()
+        }
+
+    def classify_beach_overall(self, conditions=None):
+        c = conditions or self.classify_beach_conditions()
+        extreme_uv = c["UV Index"] == "Extreme (Dangerous)"
+
+        ideal = (
+            (c["Temperature"] == "Hot")
+            & (c["Rain"] == "Dry")
+            & np.isin(c["Rain Chance"], ["Very Low Chance", "Low Chance"])
+            & (c["Wind"] == "Nice Breeze")
+            & np.isin(c["Wind Gusts"], ["Light Gusts", "Moderate Gusts"])
+            & np.isin(c["Humidity"], ["Comfortable", "Dry"])
+            & ~extreme_uv
+        )
+        good = (
+            np.isin(c["Temperature"], ["Good", "Acceptable"])
+            & (c["Rain"] != "Heavy Rain")
+            & (c["Rain Chance"] != "Very High Chance")
+            & (c["Wind Gusts"] != "Dangerous Gusts")
+            & ~extreme_uv
+        )
+        unsuitable = (
+            np.isin(c["Temperature"], ["Cold", "Very Cold"])
+            | (c["Rain"] == "Heavy Rain")
+            | (c["Rain Chance"] == "Very High Chance")
+            | (c["Wind Gusts"] == "Dangerous Gusts")
+            | extreme_uv
+        )
+        return np.select(
+            [ideal, good, unsuitable],
+            ["Ideal Beach Conditions", "Good Beach Conditions", "Not Suitable for Beach"],
+            default="Acceptable for Beach"
+        )
+
+    RECOMMENDATIONS = {
+        "Ideal Beach Conditions": "Perfect day for the beach! Enjoy the sun and bloom out!",
+        "Good Beach Conditions": "Good conditions for a beach visit. Have fun!",
+        "Acceptable for Beach": "Conditions are okay, but be prepared for cooler weather.",
+        "Not Suitable for Beach": "Not suitable for beach activities. Consider other plans."
+    }
+
+    def overall_recommendation(self, overall=None):
+        overall = self.classify_beach_overall() if overall is None else overall
+        labels = np.array(list(self.RECOMMENDATIONS))
+        texts = np.array(list(self.RECOMMENDATIONS.values()))
+        order = np.argsort(labels)
+        return texts[order[np.searchsorted(labels, overall, sorter=order)]]
+
+
+# -----------------------------
+# Fetch hourly weather
+# -----------------------------
+def _coord_key(lat, lon):
+    return (round(float(lat), 4), round(float(lon), 4))
+
+
+def fetch_hourly_weather(coords, forecast_days=3):
+    """
+    Hourly weather for many (lat, lon) pairs, one multi-location request per
+    FORECAST_BATCH_SIZE beaches. Returns a dict of (beaches x hours) arrays plus
+    per-beach local time labels.
+    """
+    columns = {name: [] for name in HOURLY_VARIABLES}
+    times = []
+    for i in range(0, len(coords), FORECAST_BATCH_SIZE):
+        chunk = coords[i:i + FORECAST_BATCH_SIZE]
+        params = {
+            "latitude": [lat for lat, _ in chunk],
+            "longitude": [lon for _, lon in chunk],
+            "hourly": ",".join(HOURLY_VARIABLES),
+            "forecast_days": forecast_days,
+            "timezone": "auto",
+            "wind_speed_unit": "kmh",
+        }
+        with track("open-meteo hourly"):
+            responses = get_openmeteo().weather_api(FORECAST_URL, params=params)
+
+        for response in responses:
+            hourly = response.Hourly()
+            for idx, name in enumerate(HOURLY_VARIABLES):
+                columns[name].append(hourly.Variables(idx).ValuesAsNumpy())
+            epochs = np.arange(hourly.Time(), hourly.TimeEnd(), hourly.Interval(), dtype=np.int64)
+            times.append(epochs)
+
+    hours = min(len(t) for t in times) if times else 0
+    data = {name: np.vstack([v[:hours] for v in values]) if values else np.empty((0, 0)) for name, values in columns.items()}
+    data["time"] = np.vstack([t[:hours] for t in times]) if times else np.empty((0, 0), dtype=np.int64)
+    return data
+
+
+def classify_hourly(data):
+    """Run the classifier over every hour of every beach in one pass."""
+    model = BeachClassModel(
+        temperature=data["temperature_2m"],
+        precipitation=data["precipitation_probability"],
+        rain=data["rain"],
+        wind_speed=data["wind_speed_10m"],
+        wind_gusts=data["wind_gusts_10m"],
+        is_day=data["is_day"],
+        cloud_cover=data["cloud_cover"],
+        weather_code=data["weather_code"],
+        humidity=data["relative_humidity_2m"],
+        uv_index=data["uv_index"]
+    )
+    conditions = model.classify_beach_conditions()
+    overall = model.classify_beach_overall(conditions)
+    return conditions, overall, model.overall_recommendation(overall)
+
+
+def _beach_payload(data, conditions, overall, recommendation, row):
+    times = np.datetime_as_string(data["time"][row].astype("datetime64[s]"), unit="m", timezone="UTC")
+    hours = []
+    for h in range(len(times)):
+        hours.append({
+            "time": str(times[h]),
+            "is_day": bool(data["is_day"][row, h]),
+            "temperature": round(float(data["temperature_2m"][row, h]), 1),
+            "rain": round(float(data["rain"][row, h]), 2),
+            "precipitation_probability": round(float(data["precipitation_probability"][row, h]), 1),
+            "wind_speed": round(float(data["wind_speed_10m"][row, h]), 1),
+            "wind_gusts": round(float(data["wind_gusts_10m"][row, h]), 1),
+            "cloud_cover": round(float(data["cloud_cover"][row, h]), 1),
+            "humidity": round(float(data["relative_humidity_2m"][row, h]), 1),
+            "uv_index": round(float(data["uv_index"][row, h]), 1),
+            "conditions": {name: str(labels[row, h]) for name, labels in conditions.items()},
+            "overall": str(overall[row, h]),
+            "recommendation": str(recommendation[row, h])
+        })
+    return {
+        "units": {"temperature": "°C", "wind_speed": "km/h", "rain": "mm"},
+        "hours": hours
+    }
+
+
+def get_hourly_conditions_batch(coords, forecast_days=3, force_refresh=False):
+    """Classified hourly conditions for many beaches; a list aligned with `coords`."""
+    now = datetime.now(timezone.utc)
+    keys = [_coord_key(lat, lon) for lat, lon in coords]
+
+    missing = []
+    for key in keys:
+        entry = _cache.get(key)
+        fresh = entry and now - entry['ts'] <= HOURLY_CACHE_TTL and entry['days'] >= forecast_days
+        if (force_refresh or not fresh) and key not in missing:
+            missing.append(key)
+
+    if missing:
+        data = fetch_hourly_weather(missing, forecast_days)
+        conditions, overall, recommendation = classify_hourly(data)
+        for row, key in enumerate(missing):
+            _cache[key] = {
+                'data': _beach_payload(data, conditions, overall, recommendation, row),
+                # raw rows, for callers that score hours numerically
+                'arrays': {name: data[name][row] for name in HOURLY_VARIABLES + ["time"]},
+                'overall': overall[row],
+                'ts': now,
+                'days': forecast_days
+            }
+
+    return [_cache[key]['data'] for key in keys]
+
+
+def get_hourly_conditions(lat, lon, forecast_days=3, force_refresh=False):
+    return get_hourly_conditions_batch([(lat, lon)], forecast_days, force_refresh)[0]
+
+
+def get_hourly_arrays(lat, lon, forecast_days=3, cached_only=False):
+    """
+    Raw hourly rows and overall labels for the first `forecast_days` days at a beach,
+    from the hourly cache (fetched from Open-Meteo on a miss). A cached entry can hold
+    more days than asked for, so it is cut to forecast_days * 24 hours. With
+    cached_only, a missing or stale entry returns None instead of fetching.
+    """
+    key = _coord_key(lat, lon)
+    if cached_only:
+        entry = _cache.get(key)
+        fresh = entry and datetime.now(timezone.utc) - entry['ts'] <= HOURLY_CACHE_TTL and entry['days'] >= forecast_days
+        if not fresh:
+            return None
+    else:
+        get_hourly_conditions(lat, lon, forecast_days)
+        entry = _cache[key]
+    hours = forecast_days * 24
+    return {name: values[:hours] for name, values in entry['arrays'].items()}, entry['overall'][:hours]
@@ -0,0 +1,144 @@
+#Daily "best beaches" ranking: every beach's per-day recommendation score is kept in
+#memory so top-k queries (optionally near a point or inside a box) never touch
+#Supabase or the weather APIs
+import os
+import threading
+from datetime import datetime, date, timedelta, timezone
+
+import numpy as np
+
+from daily_beach_forecast_backend import ForecastColumns
+from spatial import haversine_miles, bounding_box, in_box
+
+# Scores are reloaded from the beaches table this often, to pick up seed runs
+RANKING_RELOAD_INTERVAL = timedelta(minutes=int(os.environ.get("RANKING_RELOAD_MIN", 60)))
+
+
+def _parse_location(location):
+    lat_str, lon_str = location.split(",")
+    return float(lat_str.strip()), float(lon_str.strip())
+
+
+def _first_day(forecast):
+    """Local date of a forecast's first day, taken from its sunrise column."""
+    try:
+        return date.fromisoformat(forecast["sunrise"][0][:10])
+    except (TypeError, ValueError, IndexError, KeyError):
+        return datetime.now(timezone.utc).date()
+
+
+class BeachRanking:
+    """
+    Column store of per-day scores: beach i has coordinates (lat[i], lon[i]),
+    its forecast starts on day start[i] (date ordinal) and scores[i, d] is the
+    recommendation score d days later (NaN when unknown).
+    """
+
+    def __init__(self, days=7):
+        self.days = days
+        self._rows = {}  # mapbox_id -> (name, lat, lon, start ordinal, scores)
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._loaded_at = None
+        self.ids = np.empty(0, dtype=object)
+        self.names = np.empty(0, dtype=object)
+        self.lat = np.empty(0)
+        self.lon = np.empty(0)
+        self.start = np.empty(0, dtype=np.int64)
+        self.scores = np.empty((0, days), dtype=np.float32)
+
+    def update(self, mapbox_id, lat, lon, forecast, name=None):
+        """Record a beach's latest forecast (ForecastColumns or its stored JSON)."""
+        if not isinstance(forecast, ForecastColumns):
+            forecast = ForecastColumns.from_json(forecast)
+        scores = np.full(self.days, np.nan, dtype=np.float32)
+        values = forecast["recommendation_score"][:self.days]
+        scores[:len(values)] = values
+        with self._lock:
+            if name is None and mapbox_id in self._rows:
+                name = self._rows[mapbox_id][0]
+            self._rows[mapbox_id] = (name, lat, lon, _first_day(forecast).toordinal(), scores)
+            self._dirty = True
+
+    def load(self, supabase):
+        """(Re)load every beach's stored forecast from Supabase."""
+        resp = supabase.table("beaches").select("mapbox_id, name, location, forecast").execute()
+        for beach in resp.data or []:
+            if not beach.get("forecast") or not beach.get("location"):
+                continue
+            try:
+                lat, lon = _parse_location(beach["location"])
+                self.update(beach["mapbox_id"], lat, lon, beach["forecast"], name=beach.get("name"))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping ranking for {beach.get('mapbox_id')}: {e}")
+        self._loaded_at = datetime.now(timezone.utc)
+
+    def ensure_loaded(self, supabase):
+        if self._loaded_at is None or datetime.now(timezone.utc) - self._loaded_at > RANKING_RELOAD_INTERVAL:
+            self.load(supabase)
+
+    def _rebuild(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            items = list(self._rows.items())
+            self.ids = np.array([k for k, _ in items], dtype=object)
+            self.names = np.array([v[0] for _, v in items], dtype=object)
+            self.lat = np.array([v[1] for _, v in items], dtype=np.float64)
+            self.lon = np.array([v[2] for _, v in items], dtype=np.float64)
+            self.start = np.array([v[3] for _, v in items], dtype=np.int64)
+            self.scores = np.vstack([v[4] for _, v in items]) if items else np.empty((0, self.days), dtype=np.float32)
+            self._dirty = False
+
+    def top_k(self, day, k=10, near=None, radius_miles=None, bbox=None):
+        """
+        Best beaches on `day` (a date). `near`=(lat, lon) with `radius_miles`
+        keeps beaches within that distance; `bbox`=(min_lat, min_lon, max_lat, max_lon)
+        restricts to a region.
+        """
+        self._rebuild()
+        lat, lon, scores = self.lat, self.lon, self.scores
+
+        # score of each beach on the requested day
+        offset = day.toordinal() - self.start
+        covered = (offset >= 0) & (offset < self.days)
+        day_scores = np.full(len(lat), np.nan, dtype=np.float32)
+        rows = np.nonzero(covered)[0]
+        day_scores[rows] = scores[rows, offset[rows]]
+        candidates = ~np.isnan(day_scores)
+
+        # cheap box tests first, exact distance only for what survives them
+        if bbox is not None:
+            candidates &= in_box(lat, lon, bbox)
+        distances = np.full(len(lat), np.nan)
+        if near is not None:
+            if radius_miles is not None:
+                candidates &= in_box(lat, lon, bounding_box(near[0], near[1], radius_miles))
+            idx = np.nonzero(candidates)[0]
+            distances[idx] = haversine_miles(near[0], near[1], lat[idx], lon[idx])
+            if radius_miles is not None:
+                candidates[idx] = distances[idx] <= radius_miles
+
+        # highest score first, nearer beach first on ties (scores are whole numbers)
+        idx = np.nonzero(candidates)[0]
+        order_key = -day_scores[idx].astype(np.float64)
+        if near is not None:
+            order_key = order_key * 1e6 + distances[idx]
+        if len(idx) > k:
+            keep = np.argpartition(order_key, k - 1)[:k]
+            idx, order_key = idx[keep], order_key[keep]
+        idx = idx[np.argsort(order_key, kind="stable")]
+
+        return [
+            {
+                "mapbox_id": self.ids[i],
+                "name": self.names[i],
+                "location": f"{lat[i]}, {lon[i]}",
+                "recommendation_score": int(day_scores[i]),
+                "distance_miles": None if np.isnan(distances[i]) else round(float(distances[i]), 2)
+            }
+            for i in idx
+        ]
+
+
+ranking = BeachRanking()
@@ -0,0 +1,116 @@
+#Best time to visit: lines up hourly weather classes, tide height, rip current risk and
+#red tide status on one hourly grid and scores every hour at once
+import time
+
+import numpy as np
+
+from beach_conditions import get_hourly_arrays
+from tide_conditions import tide_heights_at
+
+OVERALL_POINTS = {
+    "Ideal Beach Conditions": 4.0,
+    "Good Beach Conditions": 3.0,
+    "Acceptable for Beach": 2.0,
+    "Not Suitable for Beach": 0.0,
+}
+RIP_RISK_LEVELS = {"LOW": 0, "LOW-MODERATE": 1, "MODERATE": 2, "HIGH": 3, "EXTREME": 4}
+
+
+def _overall_points(overall):
+    labels = np.array(list(OVERALL_POINTS))
+    points = np.array(list(OVERALL_POINTS.values()))
+    order = np.argsort(labels)
+    return points[order[np.searchsorted(labels, overall, sorter=order)]]
+
+
+def score_hours(overall, is_day, tide_height, tide_rising, rip_level=None, red_tide_risk=None):
+    """
+    Score for every hour (NaN for hours that can't be recommended):
+      weather class 0-4, plus up to 1 point for lower water (more beach),
+      minus rip current risk (doubled on a falling tide, when rips pull hardest)
+      and red tide risk. Night hours are excluded.
+    """
+    score = _overall_points(overall)
+
+    if tide_height is not None:
+        span = np.ptp(tide_height)
+        if span > 0:
+            score = score + 1.0 - (tide_height - tide_height.min()) / span
+
+    if rip_level:
+        falling = ~tide_rising if tide_rising is not None else np.zeros(len(score), dtype=bool)
+        score = score - 0.5 * rip_level * np.where(falling, 2.0, 1.0)
+
+    if red_tide_risk:
+        score = score - 0.5 * red_tide_risk
+
+    return np.where(is_day.astype(bool), score, np.nan)
+
+
+def best_windows(scores, window_hours=2, top=5):
+    """Highest mean-score windows of `window_hours` consecutive hours, not overlapping."""
+    if len(scores) < window_hours:
+        return []
+    window_scores = np.convolve(scores, np.ones(window_hours), mode="valid") / window_hours
+    order = np.argsort(-np.nan_to_num(window_scores, nan=-np.inf), kind="stable")
+
+    taken = np.zeros(len(scores), dtype=bool)
+    windows = []
+    for start in order:
+        if np.isnan(window_scores[start]) or len(windows) >= top:
+            break
+        if taken[start:start + window_hours].any():
+            continue
+        taken[start:start + window_hours] = True
+        windows.append((start, start + window_hours, float(window_scores[start])))
+    return windows
+
+
+def plan_best_times(lat, lon, days=3, window_hours=2, top=5, rip_risk=None, red_tide_risk=None):
+    """
+    Top visiting windows for the next `days` days, from cached data only so it
+    stays fast on request: weather from the hourly conditions cache, tides from the
+    station tide block, rip current and red tide status from whatever the caller
+    already holds. Returns None when the weather isn't cached yet; missing tides,
+    rip or red tide data just leave their terms out.
+    """
+    hourly = get_hourly_arrays(lat, lon, forecast_days=days, cached_only=True)
+    if hourly is None:
+        return None
+    arrays, overall = hourly
+    times = arrays["time"]
+
+    tide_height = tide_rising = None
+    try:
+        tide = tide_heights_at(lat, lon, times, cached_only=True)
+        if tide is not None:
+            tide_height, tide_rising = tide
+    except Exception as e:
+        print(f"Tide data unavailable for planner: {e}")
+
+    rip_level = RIP_RISK_LEVELS.get((rip_risk or "").upper())
+    scores = score_hours(overall, arrays["is_day"], tide_height, tide_rising, rip_level, red_tide_risk)
+    # the forecast starts at local midnight; hours that are already over can't be recommended
+    scores[times + 3600 <= int(time.time())] = np.nan
+
+    stamps = np.datetime_as_string(times.astype("datetime64[s]"), unit="m", timezone="UTC")
+    windows = []
+    for lo, hi, score in best_windows(scores, window_hours, top):
+        windows.append({
+            "start": str(stamps[lo]),
+            "end": str(np.datetime_as_string((times[hi - 1] + 3600).astype("datetime64[s]"), unit="m", timezone="UTC")),
+            "score": round(score, 2),
+            "conditions": [str(label) for label in overall[lo:hi]],
+            "tide_height_ft": None if tide_height is None else [round(float(h), 2) for h in tide_height[lo:hi]],
+            "tide": None if tide_rising is None else ("rising" if tide_rising[lo:hi].mean() >= 0.5 else "falling")
+        })
+
+    return {
+        "windows": windows,
+        "sources": {
+            "weather": True,
+            "tide": tide_height is not None,
+            "rip_risk": rip_risk,
+            "red_tide_risk": red_tide_risk
+        }
+    }
@@ -1,15 +1,28 @@
-import requests_cache
-from retry_requests import retry
-import openmeteo_requests
+import os
+import threading
+from upstream_stats import track
+from http_cache import get_session
 import numpy as np
-import requests
+from datetime import datetime, timedelta, timezone
 
 # -----------------------------
 # Setup Open-Meteo API Client
 # -----------------------------
-cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-retry_session = retry(cache_session, retries=10, backoff_factor=0.2)
-openmeteo = openmeteo_requests.Client(session=retry_session)
+_openmeteo = None
+_openmeteo_lock = threading.Lock()
+
+
+def get_openmeteo():
+    """The shared Open-Meteo client; the client libraries and the HTTP cache load on first call."""
+    global _openmeteo
+    if _openmeteo is None:
+        with _openmeteo_lock:
+            if _openmeteo is None:
+                import openmeteo_requests
+                from retry_requests import retry
+                retry_session = retry(get_session(), retries=10, backoff_factor=0.2)
+                _openmeteo = openmeteo_requests.Client(session=retry_session)
+    return _openmeteo
 
 # Weather code mapping
 WEATHER_CODES = {
@@ -30,133 +43,274 @@ WEATHER_CODES = {
     75: "Snow Showers"
 }
 
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+
+# Locations per multi-location Open-Meteo request
+FORECAST_BATCH_SIZE = int(os.environ.get("FORECAST_BATCH_SIZE", 100))
+
+FORECAST_DAILY_VARIABLES = [
+    "temperature_2m_max", "temperature_2m_min",
+    "weather_code", "wind_speed_10m_max",
+    "wind_direction_10m_dominant",
+    "wind_gusts_10m_max",
+    "precipitation_probability_max", "uv_index_max",
+    "relative_humidity_2m_max",
+    "sunrise", "sunset"
+]
+
+
+# How long a grid cell's forecast is reused for every beach inside it
+FORECAST_CACHE_TTL = timedelta(minutes=int(os.environ.get("FORECAST_CACHE_TTL_MIN", 60)))
+
+# Open-Meteo answers with the coordinate of the model grid cell it used, so
+# nearby beaches that land in the same cell can share a single forecast.
+_grid_cells = {}       # rounded query coordinate -> grid cell coordinate
+_cell_forecasts = {}   # grid cell coordinate -> {'data': <forecast>, 'ts': datetime}
+
+
+def _coord_key(lat, lon):
+    return (round(float(lat), 4), round(float(lon), 4))
+
+
+def _cached_cell_forecast(cell, now):
+    entry = _cell_forecasts.get(cell)
+    if not entry or now - entry['ts'] > FORECAST_CACHE_TTL:
+        return None
+    return entry['data']
+
+
+def _coord_params(coords):
+    return {
+        "latitude": [lat for lat, _ in coords],
+        "longitude": [lon for _, lon in coords],
+    }
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 # -----------------------------
 # Fetch beach forecast
 # -----------------------------
-def get_beach_forecast(lat, lon):
-    def safe_values(var):
-        try:
-            vals = var.ValuesAsNumpy()
-            if np.isscalar(vals):
-                return [float(vals)]
-            else:
-                return [float(v) for v in vals.tolist()]
-        except Exception:
-            return [None] * 7
-
-    # --- 1. Main Forecast ---
-    url_forecast = "https://api.open-meteo.com/v1/forecast"
+def _fetch_forecast_chunk(coords):
+    """
+    Fetch forecast (including sunrise/sunset) and air quality for up to FORECAST_BATCH_SIZE
+    locations with one request each. Open-Meteo answers multi-location requests
+    with one response per location, in request order.
+    Returns (grid cell, forecast) pairs.
+    """
+    # --- 1. Main Forecast (sunrise/sunset arrive as int64 epoch variables) ---
     params_forecast = {
-        "latitude": lat,
-        "longitude": lon,
-        "daily": ",".join([
-            "temperature_2m_max", "temperature_2m_min",
-            "weather_code", "wind_speed_10m_max",
-            "wind_direction_10m_dominant",
-            "wind_gusts_10m_max",
-            "precipitation_probability_max", "uv_index_max",
-            "relative_humidity_2m_max",
-            "sunrise", "sunset"
-        ]),
+        **_coord_params(coords),
+        "daily": ",".join(FORECAST_DAILY_VARIABLES),
         "forecast_days": 7,
         "timezone": "auto",
         "temperature_unit": "fahrenheit",
         "current": "temperature_2m",
     }
-    forecast_responses = openmeteo.weather_api(url_forecast, params=params_forecast)
-    forecast_daily = forecast_responses[0].Daily()
-
-    current = forecast_responses[0].Current()
-    temp = current.Variables(0).Value()
-
-    def var_list(idx, as_int=False):
-        vals = forecast_daily.Variables(idx).ValuesAsNumpy()
-        if np.isscalar(vals):
-            return [int(vals) if as_int else float(vals)]
-        else:
-            return [int(v) if as_int else float(v) for v in vals.tolist()]
-
-    temp_max = var_list(0)
-    temp_min = var_list(1)
-    weather_code = var_list(2, as_int=True)
-    wind_speed = var_list(3)
-    wind_dir = var_list(4)
-    gust_speed = var_list(5)
-    precipitation = safe_values(forecast_daily.Variables(6))
-    uv_index = safe_values(forecast_daily.Variables(7))
-    humidity = safe_values(forecast_daily.Variables(8))
-
-    # --- 2. Sunrise and Sunset ---
-    res = requests.get(
-        "https://api.open-meteo.com/v1/forecast",
-        params={
-            "latitude": lat,
-            "longitude": lon,
-            "daily": "sunrise,sunset",
-            "forecast_days": 7,
-            "timezone": "auto"
-        }
-    ).json()
-    sunrise = res["daily"]["sunrise"]
-    sunset = res["daily"]["sunset"]
+    with track("open-meteo forecast"):
+        forecast_responses = get_openmeteo().weather_api(FORECAST_URL, params=params_forecast)
 
-    # --- 3. Air Quality ---
-    url_air = "https://air-quality-api.open-meteo.com/v1/air-quality"
+    # --- 2. Air Quality ---
     params_air = {
-        "latitude": lat,
-        "longitude": lon,
+        **_coord_params(coords),
         "hourly": "pm10",
         "forecast_days": 5,
         "timezone": "auto"
     }
-    air_responses = openmeteo.weather_api(url_air, params=params_air)
-    air_hourly = air_responses[0].Hourly()
+    with track("open-meteo air-quality"):
+        air_responses = get_openmeteo().weather_api(AIR_QUALITY_URL, params=params_air)
+
+    return [
+        (_coord_key(forecast.Latitude(), forecast.Longitude()), ForecastColumns.from_responses(forecast, air))
+        for forecast, air in zip(forecast_responses, air_responses)
+    ]
+
+
+def _local_times(var, utc_offset_seconds):
+    """Epoch seconds -> local 'YYYY-MM-DDTHH:MM' strings, as in Open-Meteo's JSON output."""
+    epochs = var.ValuesInt64AsNumpy() + utc_offset_seconds
+    return np.datetime_as_string(epochs.astype("datetime64[s]"), unit="m").tolist()
+
+
+def _values(var, days=7):
+    """Variable values as a float64 array of length `days`; missing entries are NaN."""
     try:
-        pm10_values = air_hourly.Variables(0).ValuesAsNumpy()
-        air_quality_daily = [
-            float(np.nanmean(pm10_values[i:i+24])) if len(pm10_values[i:i+24]) > 0 else None
-            for i in range(0, len(pm10_values), 24)
-        ]
-        air_quality_daily += [None] * (7 - len(air_quality_daily))
+        vals = np.atleast_1d(np.asarray(var.ValuesAsNumpy(), dtype=np.float64))
     except Exception:
-        air_quality_daily = [None] * 7
+        return np.full(days, np.nan)
+    out = np.full(days, np.nan)
+    out[:min(days, len(vals))] = vals[:days]
+    return out
+
 
-    # --- 4. Recommendation score ---
-    def recommendation_score(i):
-        score = 0
+def _daily_means(hourly_values, days=7):
+    """Mean of each 24 hour block, NaN for days without data."""
+    hours = min(len(hourly_values), days * 24)
+    padded = np.full(days * 24, np.nan)
+    padded[:hours] = hourly_values[:hours]
+    blocks = padded.reshape(days, 24)
+    has_data = ~np.all(np.isnan(blocks), axis=1)
+    means = np.full(days, np.nan)
+    means[has_data] = np.nanmean(blocks[has_data], axis=1)
+    return means
+
+
+def recommendation_scores(temp_max, precipitation, wind_speed, uv_index, air_quality):
+    """Beach score per day (0-5); NaN inputs never earn their point."""
+    return (
         # temperature between 70-85°F
-        if 70 <= temp_max[i] <= 85:
-            score += 1
+        ((temp_max >= 70) & (temp_max <= 85)).astype(np.int8)
         # low precipitation
-        if precipitation[i] is not None and precipitation[i] < 20:
-            score += 1
+        + (precipitation < 20)
         # moderate wind
-        if wind_speed[i] < 15:
-            score += 1
+        + (wind_speed < 15)
         # UV index not extreme
-        if uv_index[i] is not None and uv_index[i] <= 8:
-            score += 1
+        + (uv_index <= 8)
         # air quality good
-        if air_quality_daily[i] is not None and air_quality_daily[i] < 50:
-            score += 1
-        return score
+        + (air_quality < 50)
+    )
 
-    # --- 5. Merge into daily dictionaries ---
-    return [
-        {
-            "temp": float(temp) if i == 0 else (float(temp_max[i]) + float(temp_min[i])) / 2,
-            "temp_max": float(temp_max[i]),
-            "temp_min": float(temp_min[i]),
-            "weather_code": int(weather_code[i]),
-            "wind_speed": float(wind_speed[i]),
-            "wind_dir": float(wind_dir[i]),
-            "gust_speed": float(gust_speed[i]),
-            "precipitation": float(precipitation[i]) if precipitation[i] is not None else None,
-            "uv_index": float(uv_index[i]) if uv_index[i] is not None else None,
-            "humidity": float(humidity[i]) if humidity[i] is not None else None,
-            "sunrise": sunrise[i],
-            "sunset": sunset[i],
-            "air_quality": float(air_quality_daily[i]) if air_quality_daily[i] is not None else None,
-            "recommendation_score": recommendation_score(i)
-        } for i in range(7)
-    ]
\ No newline at end of file
+
+class ForecastColumns:
+    """
+    A beach's daily forecast held column-wise: one numpy array per variable
+    (NaN for missing values) plus sunrise/sunset strings. It renders either as
+    the per-day dict list the frontend uses or as a compact columnar dict,
+    which is also what gets stored in beaches.forecast.
+    """
+
+    FLOAT_FIELDS = (
+        "temp", "temp_max", "temp_min", "wind_speed", "wind_dir", "gust_speed",
+        "precipitation", "uv_index", "humidity", "air_quality"
+    )
+    INT_FIELDS = ("weather_code", "recommendation_score")
+    TEXT_FIELDS = ("sunrise", "sunset")
+    # key order of the per-day dicts
+    FIELDS = (
+        "temp", "temp_max", "temp_min", "weather_code", "wind_speed", "wind_dir",
+        "gust_speed", "precipitation", "uv_index", "humidity", "sunrise", "sunset",
+        "air_quality", "recommendation_score"
+    )
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.days = len(columns["temp_max"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_responses(cls, forecast_response, air_response, days=7):
+        daily = forecast_response.Daily()
+        current_temp = forecast_response.Current().Variables(0).Value()
+
+        cols = {
+            name: _values(daily.Variables(idx), days)
+            for idx, name in enumerate((
+                "temp_max", "temp_min", "weather_code", "wind_speed", "wind_dir",
+                "gust_speed", "precipitation", "uv_index", "humidity"
+            ))
+        }
+
+        utc_offset = forecast_response.UtcOffsetSeconds()
+        cols["sunrise"] = _local_times(daily.Variables(9), utc_offset)
+        cols["sunset"] = _local_times(daily.Variables(10), utc_offset)
+
+        try:
+            cols["air_quality"] = _daily_means(air_response.Hourly().Variables(0).ValuesAsNumpy(), days)
+        except Exception:
+            cols["air_quality"] = np.full(days, np.nan)
+
+        temp = (cols["temp_max"] + cols["temp_min"]) / 2
+        temp[0] = current_temp
+        cols["temp"] = temp
+        cols["recommendation_score"] = recommendation_scores(
+            cols["temp_max"], cols["precipitation"], cols["wind_speed"],
+            cols["uv_index"], cols["air_quality"]
+        )
+        return cls(cols)
+
+    @classmethod
+    def from_json(cls, data):
+        """Rebuild from a stored forecast, either columnar or the older per-day list."""
+        if isinstance(data, dict) and data.get("format") == "columnar":
+            source = data["columns"]
+        elif isinstance(data, list):
+            source = {name: [day.get(name) for day in data] for name in cls.FIELDS}
+        else:
+            raise ValueError("Unrecognised forecast format")
+
+        cols = {
+            name: np.array([np.nan if v is None else v for v in source[name]], dtype=np.float64)
+            for name in cls.FLOAT_FIELDS + cls.INT_FIELDS
+        }
+        for name in cls.TEXT_FIELDS:
+            cols[name] = list(source[name])
+        return cls(cols)
+
+    def _json_column(self, name, decimals=None):
+        col = self.columns[name]
+        if name in self.TEXT_FIELDS:
+            return list(col)
+        if name in self.INT_FIELDS:
+            return [None if np.isnan(v) else int(v) for v in col.astype(np.float64)]
+        if decimals is not None:
+            col = np.round(col, decimals)
+        return [None if np.isnan(v) else float(v) for v in col]
+
+    def to_columnar(self):
+        return {
+            "format": "columnar",
+            "days": self.days,
+            "columns": {name: self._json_column(name, decimals=2) for name in self.FIELDS}
+        }
+
+    def to_records(self):
+        cols = {name: self._json_column(name) for name in self.FIELDS}
+        return [{name: cols[name][i] for name in self.FIELDS} for i in range(self.days)]
+
+
+def get_beach_forecast(lat, lon):
+    return get_beach_forecasts([(lat, lon)], raise_errors=True)[0]
+
+
+def get_beach_forecasts(coords, batch_size=FORECAST_BATCH_SIZE, raise_errors=False):
+    """
+    Forecasts for many (lat, lon) pairs using multi-location requests.
+    Beaches are resolved to their model grid cell and each cell is fetched at
+    most once per FORECAST_CACHE_TTL; a beach seen for the first time is probed
+    with its own coordinate to learn its cell.
+    Returns a list of ForecastColumns aligned with `coords`; entries of a
+    failed batch are None.
+    """
+    keys = [_coord_key(lat, lon) for lat, lon in coords]
+    now = datetime.now(timezone.utc)
+
+    # query coordinate -> beach keys waiting on it
+    pending = {}
+    for key in keys:
+        cell = _grid_cells.get(key)
+        if cell is not None and _cached_cell_forecast(cell, now) is not None:
+            continue
+        pending.setdefault(cell or key, set()).add(key)
+
+    queries = list(pending)
+    for chunk in _chunks(queries, batch_size):
+        try:
+            fetched = _fetch_forecast_chunk(chunk)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Forecast batch of {len(chunk)} locations failed: {e}")
+            continue
+        for query, (cell, forecast) in zip(chunk, fetched):
+            _cell_forecasts[cell] = {'data': forecast, 'ts': now}
+            _grid_cells[query] = cell
+            for key in pending[query]:
+                _grid_cells[key] = cell
+
+    return [_cached_cell_forecast(_grid_cells.get(key), now) for key in keys]
@@ -528,9 +528,10 @@ beaches = [
 ]   
 
 #Print out all beaches and locations
-for location in beaches:
-    print(f"Name: {location['name']}")
-    print(f"Latitude: {location['lat']}")
-    print(f"Longitude: {location['long']}")
-    print(f"Karena Brevis Abundance: {location['abundance']}")
-    print()
\ No newline at end of file
+if __name__ == "__main__":
+    for location in beaches:
+        print(f"Name: {location['name']}")
+        print(f"Latitude: {location['lat']}")
+        print(f"Longitude: {location['long']}")
+        print(f"Karena Brevis Abundance: {location['abundance']}")
+        print()
\ No newline at end of file
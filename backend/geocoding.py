@@ -0,0 +1,214 @@
+#The one place that talks to Nominatim. Forward and reverse answers are kept in a
+#persistent SQLite cache (shared by every worker and script), queries are normalized
+#before lookup, and network calls go through a 1 req/s token bucket stored in the same
+#database, so the rate limit holds across processes as well as threads. Names of the beaches
+#in the geojson are answered from memory before any of that.
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+GEOCODE_CACHE_PATH = os.environ.get(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite")
+)
+GEOCODE_USER_AGENT = os.environ.get("GEOCODE_USER_AGENT", "beach_name_locator")
+# "not found" answers are cached too, but retried after this long
+GEOCODE_NEGATIVE_TTL = int(os.environ.get("GEOCODE_NEGATIVE_TTL_DAYS", 7)) * 86400
+# reverse lookups are keyed by coordinates rounded to this many decimals (5 ~ 1 m)
+REVERSE_DECIMALS = int(os.environ.get("GEOCODE_REVERSE_DECIMALS", 5))
+# Nominatim usage policy: at most 1 request per second
+GEOCODE_RATE = float(os.environ.get("GEOCODE_RATE_PER_S", 1.0))
+GEOCODE_BURST = int(os.environ.get("GEOCODE_BURST", 1))
+
+BEACHES_GEOJSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fl beaches.geojson")
+
+_geolocator = None
+_local = threading.local()
+_stats = {'hits': 0, 'gazetteer_hits': 0, 'misses': 0, 'waited_s': 0.0}
+# normalized name -> (lat, lon, address) for every beach in BEACHES_GEOJSON, kept in memory
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def _geocoder():
+    global _geolocator
+    if _geolocator is None:
+        from geopy.geocoders import Nominatim
+        _geolocator = Nominatim(user_agent=GEOCODE_USER_AGENT, timeout=10)
+    return _geolocator
+
+
+def _db():
+    # one connection per thread; WAL lets gunicorn workers read while another writes
+    con = getattr(_local, "con", None)
+    if con is None:
+        con = sqlite3.connect(GEOCODE_CACHE_PATH, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS forward ("
+            " query TEXT PRIMARY KEY, lat REAL, lon REAL, address TEXT, ts REAL)"
+        )
+        con.execute("CREATE TABLE IF NOT EXISTS reverse (coord TEXT PRIMARY KEY, address TEXT, ts REAL)")
+        con.execute("CREATE TABLE IF NOT EXISTS rate_limit (name TEXT PRIMARY KEY, tat REAL)")
+        _local.con = con
+    return con
+
+
+# -----------------------------
+# Keys
+# -----------------------------
+def normalize_query(query):
+    """'  Treasure Island Beach, FL ' and 'treasure island beach fl' share one cache entry."""
+    return re.sub(r"[^0-9a-z]+", " ", str(query).casefold()).strip()
+
+
+def _coord_key(lat, lon):
+    return f"{round(float(lat), REVERSE_DECIMALS):.{REVERSE_DECIMALS}f},{round(float(lon), REVERSE_DECIMALS):.{REVERSE_DECIMALS}f}"
+
+
+# -----------------------------
+# Rate limit
+# -----------------------------
+def _take_token():
+    """
+    Block until a Nominatim request may be sent. A GCRA-style token bucket whose
+    state (the theoretical arrival time) lives in SQLite; BEGIN IMMEDIATE makes
+    the read-modify-write atomic across processes.
+    """
+    interval = 1.0 / GEOCODE_RATE
+    con = _db()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        row = con.execute("SELECT tat FROM rate_limit WHERE name = 'nominatim'").fetchone()
+        now = time.time()
+        tat = max(row[0] if row else now, now)
+        send_at = max(now, tat - (GEOCODE_BURST - 1) * interval)
+        con.execute("INSERT OR REPLACE INTO rate_limit (name, tat) VALUES ('nominatim', ?)", (tat + interval,))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    wait = send_at - now
+    if wait > 0:
+        _stats['waited_s'] += wait
+        time.sleep(wait)
+
+
+# -----------------------------
+# Lookups
+# -----------------------------
+def geocode(query):
+    """(lat, lon, address) for a place name, or None if Nominatim doesn't know it."""
+    key = normalize_query(query)
+    known = load_gazetteer().get(key)
+    if known:
+        _stats['gazetteer_hits'] += 1
+        return known
+
+    con = _db()
+    row = con.execute("SELECT lat, lon, address, ts FROM forward WHERE query = ?", (key,)).fetchone()
+    if row and (row[0] is not None or time.time() - row[3] < GEOCODE_NEGATIVE_TTL):
+        _stats['hits'] += 1
+        return (row[0], row[1], row[2]) if row[0] is not None else None
+
+    _stats['misses'] += 1
+    _take_token()
+    location = _geocoder().geocode(query)
+    result = (location.latitude, location.longitude, location.address) if location else None
+    with con:
+        con.execute(
+            "INSERT OR REPLACE INTO forward (query, lat, lon, address, ts) VALUES (?, ?, ?, ?, ?)",
+            (key, *(result or (None, None, None)), time.time())
+        )
+    return result
+
+
+def reverse(lat, lon):
+    """Address for a coordinate, or None if Nominatim has nothing there."""
+    key = _coord_key(lat, lon)
+    con = _db()
+    row = con.execute("SELECT address, ts FROM reverse WHERE coord = ?", (key,)).fetchone()
+    if row and (row[0] is not None or time.time() - row[1] < GEOCODE_NEGATIVE_TTL):
+        _stats['hits'] += 1
+        return row[0]
+
+    _stats['misses'] += 1
+    _take_token()
+    location = _geocoder().reverse(tuple(float(v) for v in key.split(",")))
+    address = location.address if location else None
+    with con:
+        con.execute(
+            "INSERT OR REPLACE INTO reverse (coord, address, ts) VALUES (?, ?, ?)",
+            (key, address, time.time())
+        )
+    return address
+
+
+def stats():
+    return dict(_stats)
+
+
+# -----------------------------
+# Bulk loading
+# -----------------------------
+def _geojson_places(path):
+    """
+    (query key, lat, lon, place_name) for point features with a place_name:
+    "Butler Beach, Florida, United States" is keyed by the full name,
+    "Butler Beach" and "Butler Beach Florida".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f).get("features", [])
+
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        place_name = (feature.get("properties") or {}).get("place_name")
+        if geometry.get("type") != "Point" or not place_name:
+            continue
+        lon, lat = geometry["coordinates"][:2]
+        name = place_name.split(",")[0].strip()
+        for query in {place_name, name, f"{name} Florida"}:
+            yield normalize_query(query), lat, lon, place_name
+
+
+def load_gazetteer(path=BEACHES_GEOJSON):
+    """
+    The beach names from the geojson as an in-memory lookup, read once per process
+    (app.warm() does it before gunicorn forks). Returns the dict.
+    """
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                places = {}
+                if os.path.exists(path):
+                    places = {key: (lat, lon, address) for key, lat, lon, address in _geojson_places(path)}
+                _gazetteer = places
+    return _gazetteer
+
+
+def seed_from_geojson(path=BEACHES_GEOJSON):
+    """Pre-fill the forward cache from the geojson (no network). Returns the number of keys written."""
+    now = time.time()
+    rows = [(key, lat, lon, address, now) for key, lat, lon, address in _geojson_places(path)]
+
+    con = _db()
+    with con:
+        con.executemany(
+            "INSERT OR REPLACE INTO forward (query, lat, lon, address, ts) VALUES (?, ?, ?, ?, ?)", rows
+        )
+    return len(rows)
+
+
+def geocode_many(queries):
+    """Geocode a list of names, hitting the network (rate limited) only for uncached ones."""
+    return {query: geocode(query) for query in queries}
+
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else BEACHES_GEOJSON
+    print(f"Seeded {seed_from_geojson(path)} geocode cache entries from {path} -> {GEOCODE_CACHE_PATH}")
@@ -0,0 +1,9 @@
+#gunicorn settings for the API: gunicorn -c gunicorn.conf.py wsgi:app
+#preload_app imports wsgi.py (and runs app.warm()) once in the master before forking,
+#so the workers share the static datasets copy-on-write instead of each loading its own.
+import os
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "gthread"
+preload_app = True
@@ -0,0 +1,229 @@
+#HTTP response cache shared by the Open-Meteo clients. Everything is configured from env:
+#  HTTP_CACHE_BACKEND      sqlite (default) or memory
+#  HTTP_CACHE_PATH         SQLite file (default: <tmp>/bloomsight_http_cache.sqlite)
+#  HTTP_CACHE_WAL          1/0, WAL journal so gunicorn workers can read while one writes
+#  HTTP_CACHE_EXPIRE_S     default response lifetime in seconds
+#  HTTP_CACHE_MAX_MB       size cap; oldest-expiring responses are dropped past it (0 = no cap)
+#  HTTP_CACHE_PURGE_MIN    how often expired responses are deleted (0 = never)
+#  HTTP_CACHE_MEMORY_ITEMS in-process LRU of decoded responses in front of SQLite (0 = off)
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+HTTP_CACHE_BACKEND = os.environ.get("HTTP_CACHE_BACKEND", "sqlite").lower()
+HTTP_CACHE_PATH = os.environ.get(
+    "HTTP_CACHE_PATH", os.path.join(tempfile.gettempdir(), "bloomsight_http_cache.sqlite")
+)
+HTTP_CACHE_WAL = os.environ.get("HTTP_CACHE_WAL", "1") == "1"
+HTTP_CACHE_EXPIRE_S = int(os.environ.get("HTTP_CACHE_EXPIRE_S", 3600))
+HTTP_CACHE_MAX_MB = float(os.environ.get("HTTP_CACHE_MAX_MB", 200))
+HTTP_CACHE_PURGE_MIN = float(os.environ.get("HTTP_CACHE_PURGE_MIN", 30))
+HTTP_CACHE_MEMORY_ITEMS = int(os.environ.get("HTTP_CACHE_MEMORY_ITEMS", 256))
+
+_session = None
+_session_lock = threading.Lock()
+_maintenance_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'purges': 0, 'evicted': 0, 'last_purge': None}
+
+
+# -----------------------------
+# In-memory tier
+# -----------------------------
+class MemoryTier(MutableMapping):
+    """
+    Small LRU of decoded responses in front of a persistent storage dict.
+    Reads that hit the LRU skip SQLite and deserialization entirely; writes
+    and deletes go through to the backing storage.
+    """
+
+    def __init__(self, backing, max_items):
+        self.backing = backing
+        self.max_items = max_items
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                value = self._lru[key]
+                hit = True
+            else:
+                hit = False
+        if hit:
+            with _stats_lock:
+                _stats['memory_hits'] += 1
+            return value
+        value = self.backing[key]
+        self._remember(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backing[key] = value
+        self._remember(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._lru.pop(key, None)
+        del self.backing[key]
+
+    def __contains__(self, key):
+        return key in self._lru or key in self.backing
+
+    def __iter__(self):
+        return iter(self.backing)
+
+    def __len__(self):
+        return len(self.backing)
+
+    def forget(self, keys=None):
+        """Drop entries from the LRU only (after bulk deletes done in SQL)."""
+        with self._lock:
+            if keys is None:
+                self._lru.clear()
+            else:
+                for key in keys:
+                    self._lru.pop(key, None)
+
+    def bulk_delete(self, keys=None, values=None):
+        self.forget(keys if values is None else None)
+        self.backing.bulk_delete(keys=keys, values=values)
+
+    def clear(self):
+        self.forget()
+        self.backing.clear()
+
+    def __getattr__(self, name):
+        # SQLiteDict extras: connection(), sorted(), size(), vacuum(), table_name, ...
+        return getattr(self.backing, name)
+
+
+# -----------------------------
+# Session
+# -----------------------------
+def _build_backend():
+    if HTTP_CACHE_BACKEND == "memory":
+        return "memory"
+
+    from requests_cache.backends.sqlite import SQLiteCache
+    backend = SQLiteCache(HTTP_CACHE_PATH, wal=HTTP_CACHE_WAL, busy_timeout=5000)
+    if HTTP_CACHE_MEMORY_ITEMS > 0:
+        backend.responses = MemoryTier(backend.responses, HTTP_CACHE_MEMORY_ITEMS)
+    return backend
+
+
+def _count_response(response, *args, **kwargs):
+    with _stats_lock:
+        _stats['hits' if getattr(response, 'from_cache', False) else 'misses'] += 1
+    _maybe_maintain(response)
+    return response
+
+
+def get_session():
+    """The process-wide CachedSession, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests_cache  # deferred: only workers that call Open-Meteo pay for it
+                session = requests_cache.CachedSession(
+                    backend=_build_backend(), expire_after=HTTP_CACHE_EXPIRE_S
+                )
+                session.hooks['response'].append(_count_response)
+                _session = session
+                print(f"HTTP cache: {HTTP_CACHE_BACKEND}" + (f" at {HTTP_CACHE_PATH}" if HTTP_CACHE_BACKEND != "memory" else ""))
+    return _session
+
+
+# -----------------------------
+# Maintenance: expired purge + size cap
+# -----------------------------
+def _maybe_maintain(response):
+    # piggy-backs on network fetches, so an idle worker never touches the file
+    if getattr(response, 'from_cache', False) or HTTP_CACHE_PURGE_MIN <= 0:
+        return
+    last = _stats['last_purge']
+    if last is not None and time.time() - last < HTTP_CACHE_PURGE_MIN * 60:
+        return
+    if _maintenance_lock.acquire(blocking=False):
+        try:
+            purge()
+        except Exception as e:
+            print(f"HTTP cache maintenance failed: {e}")
+        finally:
+            _maintenance_lock.release()
+
+
+def _db_bytes(responses):
+    # bytes in use: pages freed by a delete stay in the file (freelist) until VACUUM,
+    # so they are left out; with WAL, recent writes live in the -wal file, not the main one
+    with responses.connection() as con:
+        pages = con.execute("PRAGMA page_count").fetchone()[0]
+        free = con.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = con.execute("PRAGMA page_size").fetchone()[0]
+    return (pages - free) * page_size
+
+
+def _enforce_size_cap(cache):
+    max_bytes = HTTP_CACHE_MAX_MB * 1024 * 1024
+    responses = cache.responses
+    size = _db_bytes(responses)
+    if max_bytes <= 0 or size <= max_bytes:
+        return 0
+
+    # Evict the share of rows that should bring the file back under the cap,
+    # soonest-to-expire first, then VACUUM so the file actually shrinks
+    count = len(responses)
+    evict = min(count, int(count * (1 - max_bytes / size)) + 1)
+    with responses._lock, responses.connection(commit=True) as con:
+        rows = con.execute(
+            f"SELECT key FROM {responses.table_name} ORDER BY expires LIMIT ?", (evict,)
+        ).fetchall()
+        keys = [row[0] for row in rows]
+        con.executemany(f"DELETE FROM {responses.table_name} WHERE key = ?", [(k,) for k in keys])
+    if isinstance(responses, MemoryTier):
+        responses.forget(keys)
+    responses.vacuum()
+    return len(keys)
+
+
+def purge():
+    """Delete expired responses and enforce HTTP_CACHE_MAX_MB. Safe to call from a cron/CLI."""
+    from requests_cache.backends.sqlite import SQLiteCache
+    cache = get_session().cache
+    cache.delete(expired=True, vacuum=False)
+    evicted = 0
+    if isinstance(cache, SQLiteCache):
+        if isinstance(cache.responses, MemoryTier):
+            cache.responses.forget()
+        evicted = _enforce_size_cap(cache)
+    with _stats_lock:
+        _stats['purges'] += 1
+        _stats['evicted'] += evicted
+        _stats['last_purge'] = time.time()
+    return evicted
+
+
+def stats():
+    """Hit/miss counters for this worker plus the current cache size."""
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out['hits'] + out['misses']
+    out['hit_rate'] = round(out['hits'] / lookups, 3) if lookups else None
+    out['backend'] = HTTP_CACHE_BACKEND
+    if _session is not None and HTTP_CACHE_BACKEND != "memory":
+        out['path'] = HTTP_CACHE_PATH
+        out['entries'] = len(_session.cache.responses)
+        out['size_mb'] = round(_db_bytes(_session.cache.responses) / (1024 * 1024), 2)
+    return out
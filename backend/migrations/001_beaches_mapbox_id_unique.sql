@@ -0,0 +1,14 @@
+-- Unique mapbox_id on beaches, required by seed_beaches.py: its batch upserts
+-- (POST /rest/v1/beaches?on_conflict=mapbox_id) are rejected with a 400 without it.
+-- Run once in the Supabase SQL editor before seeding; safe to run again.
+
+-- 1. The old seeder inserted row by row, so every reseed added another copy of each
+--    beach. Comments, pictures and reports refer to beaches by mapbox_id, not by row,
+--    so dropping the extra copies orphans nothing. One copy per mapbox_id is kept.
+delete from public.beaches dup
+using public.beaches keep
+where dup.mapbox_id = keep.mapbox_id
+  and dup.ctid > keep.ctid;
+
+-- 2. The conflict target for the upserts (rows without a mapbox_id stay allowed).
+create unique index if not exists beaches_mapbox_id_key on public.beaches (mapbox_id);
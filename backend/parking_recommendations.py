@@ -0,0 +1,158 @@
+#Precomputed top-N parking/access recommendations per beach, kept in a compact .npz
+#next to the backend. Ranking only depends on beach coordinates and the access-point
+#CSV, so /parking-spots can serve these directly; refresh() recomputes only the
+#beaches that a CSV change (or a moved/new beach) can actually affect.
+import os
+import threading
+
+import numpy as np
+
+from beach_access_points import get_access_points, rank_access_points_many, build_response
+from spatial import haversine_miles
+
+PARKING_RECS_PATH = os.environ.get(
+    "PARKING_RECS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "parking_recommendations.npz")
+)
+PARKING_RECS_RADIUS = 2.0  # same radius as the live ranking
+PARKING_RECS_TOP = 5
+# past this many changed access points a full rebuild is cheaper than the diff
+FULL_REBUILD_CHANGES = 500
+
+_loaded = {'store': None, 'mtime': None}
+_lock = threading.Lock()
+
+
+def _read(path=PARKING_RECS_PATH):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def _write(store, path=PARKING_RECS_PATH):
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(tmp, **store)
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def _affected(previous, table, beach_ids, lats, lons):
+    """Bool per beach: does it need recomputing against `previous`?"""
+    n = len(beach_ids)
+    if previous is None or int(previous['top']) != PARKING_RECS_TOP or float(previous['radius']) != PARKING_RECS_RADIUS:
+        return np.ones(n, dtype=bool)
+
+    # beaches that are new or moved
+    old_row = {bid: i for i, bid in enumerate(previous['beach_ids'])}
+    idx = np.array([old_row.get(bid, -1) for bid in beach_ids], dtype=np.int64)
+    affected = idx < 0
+    known = ~affected
+    affected[known] |= (previous['beach_lat'][idx[known]] != lats[known]) | (previous['beach_lon'][idx[known]] != lons[known])
+
+    # access points added, removed or edited since the last run (old and new positions)
+    old_hash = dict(zip(previous['ap_keys'], previous['ap_hash']))
+    new_hash = dict(zip(table.keys, table.row_hash))
+    changed_new = [table.row_of_key[k] for k, h in new_hash.items() if old_hash.get(k) != h]
+    changed_old = [i for i, (k, h) in enumerate(zip(previous['ap_keys'], previous['ap_hash'])) if new_hash.get(k) != h]
+    points_lat = np.concatenate([table.lat[changed_new], previous['ap_lat'][changed_old]])
+    points_lon = np.concatenate([table.lon[changed_new], previous['ap_lon'][changed_old]])
+    if len(points_lat) > FULL_REBUILD_CHANGES:
+        return np.ones(n, dtype=bool)
+    if not len(points_lat):
+        return affected
+
+    # a change matters to a beach if it's within the radius, or closer than the
+    # farthest point it currently lists (k-nearest fallback beaches)
+    reach = np.full(n, PARKING_RECS_RADIUS)
+    reach[known] = np.fmax(reach[known], np.nan_to_num(np.nanmax(previous['dist'][idx[known]], axis=1, initial=0.0)))
+    for plat, plon in zip(points_lat, points_lon):
+        affected |= haversine_miles(plat, plon, lats, lons) <= reach
+    return affected
+
+
+def refresh(beaches, path=PARKING_RECS_PATH, full=False):
+    """
+    Bring the store up to date for `beaches` [(mapbox_id, lat, lon)], dropping
+    beaches no longer listed. Returns the number of beaches recomputed.
+    """
+    table = get_access_points()
+    beach_ids = np.array([str(b[0]) for b in beaches])
+    lats = np.array([b[1] for b in beaches], dtype=np.float64)
+    lons = np.array([b[2] for b in beaches], dtype=np.float64)
+
+    previous = None if full else _read(path)
+    affected = _affected(previous, table, beach_ids, lats, lons)
+
+    keys = np.full((len(beaches), PARKING_RECS_TOP), "", dtype=object)
+    scores = np.full((len(beaches), PARKING_RECS_TOP), np.nan, dtype=np.float32)
+    dists = np.full((len(beaches), PARKING_RECS_TOP), np.nan, dtype=np.float32)
+
+    # carry over unaffected beaches as-is
+    if previous is not None and not affected.all():
+        old_row = {bid: i for i, bid in enumerate(previous['beach_ids'])}
+        keep = np.flatnonzero(~affected)
+        src = np.array([old_row[bid] for bid in beach_ids[keep]], dtype=np.int64)
+        keys[keep], scores[keep], dists[keep] = previous['keys'][src], previous['score'][src], previous['dist'][src]
+
+    todo = np.flatnonzero(affected)
+    if len(todo):
+        rows, s, d = rank_access_points_many(lats[todo], lons[todo], table, PARKING_RECS_RADIUS, PARKING_RECS_TOP)
+        keys[todo] = np.where(rows >= 0, table.keys[np.maximum(rows, 0)], "")
+        scores[todo], dists[todo] = s, d
+
+    _write({
+        'beach_ids': beach_ids,
+        'beach_lat': lats,
+        'beach_lon': lons,
+        'keys': keys.astype(str),
+        'score': scores,
+        'dist': dists,
+        'ap_keys': table.keys.astype(str),
+        'ap_hash': table.row_hash,
+        'ap_lat': table.lat,
+        'ap_lon': table.lon,
+        'csv_digest': np.array(table.digest),
+        'radius': np.array(PARKING_RECS_RADIUS),
+        'top': np.array(PARKING_RECS_TOP),
+    }, path)
+    return len(todo)
+
+
+def _store():
+    try:
+        mtime = os.path.getmtime(PARKING_RECS_PATH)
+    except OSError:
+        return None
+    if _loaded['mtime'] != mtime:
+        with _lock:
+            if _loaded['mtime'] != mtime:
+                store = _read(PARKING_RECS_PATH)
+                store['row_of_beach'] = {bid: i for i, bid in enumerate(store['beach_ids'])}
+                _loaded['store'], _loaded['mtime'] = store, mtime
+    return _loaded['store']
+
+
+def preload():
+    """Load the store now rather than on first request. True if there is one."""
+    return _store() is not None
+
+
+def lookup(mapbox_id, beach_name, lat, lon):
+    """
+    The /parking-spots payload from the store, or None when the beach isn't in it,
+    has moved, or the store was built from a different access-point CSV.
+    """
+    store = _store()
+    if store is None:
+        return None
+    i = store['row_of_beach'].get(str(mapbox_id))
+    if i is None or store['beach_lat'][i] != float(lat) or store['beach_lon'][i] != float(lon):
+        return None
+
+    table = get_access_points()
+    if str(store['csv_digest']) != table.digest:
+        return None
+
+    listed = store['keys'][i] != ""
+    rows = [table.row_of_key[k] for k in store['keys'][i][listed]]
+    return build_response(table, beach_name, beach_name, rows, store['score'][i][listed], store['dist'][i][listed])
@@ -0,0 +1,610 @@
+#FWC red tide (Karenia brevis) samples: incremental ingestion into an append-only local
+#time series, weekly history around any point, and a per-beach status precomputed by joining every beach to the samples around it.
+#Source: RED_TIDE_SOURCE_URL (FWC CSV export or ArcGIS FeatureServer /query URL), or a local
+#RED_TIDE_FIXTURE file. Every sample must carry its own date; ingestion refuses to run without a source.
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from io import StringIO
+
+import numpy as np
+import requests
+# pandas loads inside the ingestion/parsing functions; serving only needs numpy
+
+from spatial import GridIndex, haversine_miles
+from upstream_stats import track
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+RED_TIDE_SOURCE_URL = os.environ.get("RED_TIDE_SOURCE_URL")
+# JSON list of dated samples (same fields as the source), for local runs without the FWC feed
+RED_TIDE_FIXTURE = os.environ.get("RED_TIDE_FIXTURE")
+RED_TIDE_STORE_DIR = os.environ.get("RED_TIDE_STORE_DIR", os.path.join(_HERE, "red_tide_series"))
+# ingests append segments; past this many they are merged into one
+RED_TIDE_MAX_SEGMENTS = int(os.environ.get("RED_TIDE_MAX_SEGMENTS", 32))
+# stored sample days are int32 offsets from this date
+SERIES_EPOCH_DAY = int(np.datetime64("2000-01-01", "D").astype(np.int64))
+RED_TIDE_STATUS_PATH = os.environ.get("RED_TIDE_STATUS_PATH", os.path.join(_HERE, "red_tide_status.json"))
+# a beach takes the worst recent sample within this distance
+RED_TIDE_RADIUS_MILES = float(os.environ.get("RED_TIDE_RADIUS_MILES", 10))
+# samples older than this (relative to the newest sample) no longer count
+RED_TIDE_LOOKBACK_DAYS = int(os.environ.get("RED_TIDE_LOOKBACK_DAYS", 14))
+
+# Interpolated abundance raster over Florida's coast (min_lat, min_lon, max_lat, max_lon)
+RED_TIDE_GRID_PATH = os.environ.get("RED_TIDE_GRID_PATH", os.path.join(_HERE, "red_tide_grid.npz"))
+RED_TIDE_GRID_BBOX = (24.3, -87.7, 31.1, -79.8)
+RED_TIDE_GRID_DEG = float(os.environ.get("RED_TIDE_GRID_DEG", 0.02))  # ~1.4 mi cells
+# inverse-distance weighting: weight = age_decay / max(d, IDW_MIN_MILES) ** IDW_POWER
+IDW_POWER = 2.0
+IDW_MIN_MILES = 0.5
+IDW_MAX_MILES = float(os.environ.get("RED_TIDE_IDW_MAX_MILES", 25))  # cells farther from every sample stay empty
+IDW_HALF_LIFE_DAYS = float(os.environ.get("RED_TIDE_HALF_LIFE_DAYS", 5))
+
+# FWC abundance categories, lowest first; the index is the stored level
+ABUNDANCE_LEVELS = np.array(["not present", "background", "very low", "low", "medium", "high"])
+# cells/L upper bound of each category (inclusive), for sources that only report counts
+CELL_BREAKPOINTS = np.array([0, 1_000, 10_000, 100_000, 1_000_000], dtype=np.float64)
+# the 0-5 karena_brevis_risk the app has always reported per category
+RISK_SCORES = np.array([0, 0, 0, 1, 3, 5], dtype=np.int8)
+
+# accepted source field names (lower-cased) per column
+_FIELDS = {
+    "site": ("site", "location", "site_location", "name", "station"),
+    "lat": ("lat", "latitude", "y"),
+    "lon": ("lon", "long", "longitude", "x"),
+    "date": ("sample_date", "sampledate", "date", "date_collected", "collected"),
+    "abundance": ("abundance", "category", "karenia_brevis_levels", "description"),
+    "cells": ("cells", "cellcount", "cell_count", "count_", "kb_cells_l"),
+}
+
+_status = {'data': None, 'mtime': None}
+_grid = {'data': None, 'mtime': None}
+_series = {'data': None, 'key': None}
+_status_lock = threading.Lock()
+
+
+# -----------------------------
+# Source parsing
+# -----------------------------
+def _epoch_day(values):
+    """Dates (strings, datetimes or epoch ms) -> int32 days since 1970-01-01."""
+    import pandas as pd
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        stamps = pd.to_datetime(values, unit="ms", utc=True, errors="coerce")
+    else:
+        stamps = pd.to_datetime(values, utc=True, errors="coerce")
+    days = stamps.dt.tz_localize(None).values.astype("datetime64[D]").astype(np.int64)
+    days[stamps.isna().to_numpy()] = 0  # dropped as invalid
+    return days.astype(np.int32)
+
+
+def abundance_levels(labels=None, cells=None):
+    """Category labels and/or cells/L -> level index into ABUNDANCE_LEVELS (-1 if unknown)."""
+    import pandas as pd
+    n = len(labels) if labels is not None else len(cells)
+    levels = np.full(n, -1, dtype=np.int8)
+    if labels is not None:
+        text = pd.Series(labels, dtype=object).fillna("").astype(str).str.strip().str.lower()
+        lookup = {label: i for i, label in enumerate(ABUNDANCE_LEVELS)}
+        levels = text.map(lookup).fillna(-1).to_numpy(dtype=np.int8)
+    if cells is not None:
+        cells = np.asarray(cells, dtype=np.float64)
+        from_cells = np.searchsorted(CELL_BREAKPOINTS, cells, side="left").astype(np.int8)
+        use = (levels < 0) & ~np.isnan(cells)
+        levels[use] = from_cells[use]
+    return levels
+
+
+def _normalize(frame):
+    """Any supported source table -> site, lat, lon, day, level, cells columns."""
+    import pandas as pd
+    columns = {c.lower().replace(" ", "_").replace("\n", "_"): c for c in frame.columns}
+    pick = {key: next((columns[n] for n in names if n in columns), None) for key, names in _FIELDS.items()}
+    if pick["lat"] is None or pick["lon"] is None:
+        raise ValueError("Red tide source has no latitude/longitude columns")
+    if pick["date"] is None:
+        # stamping undated samples with the ingest day would re-add them as new every run
+        raise ValueError("Red tide source has no sample date column")
+
+    cells = pd.to_numeric(frame[pick["cells"]], errors="coerce").to_numpy() if pick["cells"] else None
+    labels = frame[pick["abundance"]].to_numpy() if pick["abundance"] else None
+    if labels is None and cells is None:
+        raise ValueError("Red tide source has neither abundance categories nor cell counts")
+
+    out = pd.DataFrame({
+        "site": frame[pick["site"]].fillna("").astype(str).str.strip() if pick["site"] else "",
+        "lat": pd.to_numeric(frame[pick["lat"]], errors="coerce"),
+        "lon": pd.to_numeric(frame[pick["lon"]], errors="coerce"),
+        "day": _epoch_day(frame[pick["date"]]),
+        "level": abundance_levels(labels, cells),
+        "cells": cells if cells is not None else np.nan,
+    })
+    out = out[out["lat"].notna() & out["lon"].notna() & (out["level"] >= 0) & (out["day"] > 0)]
+    # unnamed sites are identified by position
+    unnamed = out["site"] == ""
+    out.loc[unnamed, "site"] = out.loc[unnamed, "lat"].round(4).astype(str) + ", " + out.loc[unnamed, "lon"].round(4).astype(str)
+    return out.reset_index(drop=True)
+
+
+def _arcgis_frame(payload):
+    import pandas as pd
+    features = payload.get("features", [])
+    rows = []
+    for feature in features:
+        attrs = dict(feature.get("attributes") or feature.get("properties") or {})
+        geometry = feature.get("geometry") or {}
+        if "x" in geometry:
+            attrs.setdefault("longitude", geometry["x"])
+            attrs.setdefault("latitude", geometry["y"])
+        elif geometry.get("type") == "Point":
+            attrs.setdefault("longitude", geometry["coordinates"][0])
+            attrs.setdefault("latitude", geometry["coordinates"][1])
+        rows.append(attrs)
+    return pd.DataFrame(rows)
+
+
+def fetch_samples(since_day=None):
+    """New samples from the configured source (or the fixture) as a normalized frame."""
+    import pandas as pd
+    if not RED_TIDE_SOURCE_URL:
+        if not RED_TIDE_FIXTURE:
+            raise RuntimeError("No red tide source: set RED_TIDE_SOURCE_URL (or RED_TIDE_FIXTURE for local data)")
+        with open(RED_TIDE_FIXTURE, "r", encoding="utf-8") as f:
+            return _normalize(pd.DataFrame(json.load(f)))
+
+    params = {}
+    if "/query" in RED_TIDE_SOURCE_URL:
+        # ArcGIS: only ask for what we don't have yet
+        params = {"where": "1=1", "outFields": "*", "f": "json", "outSR": 4326}
+        if since_day is not None:
+            since = np.datetime64(int(since_day), "D")
+            params["where"] = f"SAMPLE_DATE >= DATE '{since}'"
+
+    with track("fwc red tide"):
+        response = requests.get(RED_TIDE_SOURCE_URL, params=params, timeout=60)
+    response.raise_for_status()
+
+    if "json" in response.headers.get("Content-Type", "") or response.text.lstrip().startswith("{"):
+        frame = _arcgis_frame(response.json())
+    else:
+        frame = pd.read_csv(StringIO(response.text))
+    return _normalize(frame)
+
+
+# -----------------------------
+# Sample store: append-only time series
+# -----------------------------
+#   sites.json      site dictionary {"names", "lat", "lon"}; a site's id is its position, and ids never change
+#   seg-000001.npz  one segment per ingest: site (int32), day (int32 offset from SERIES_EPOCH_DAY),
+#                   level (int8), cells (float32)
+# A (site, day) repeated in a later segment replaces the earlier sample. Readers get the
+# merged series sorted by (site, day), so a site's samples in a date range are a binary
+# search away.
+def _sites_path(root):
+    return os.path.join(root, "sites.json")
+
+
+def _read_sites(root):
+    path = _sites_path(root)
+    if not os.path.exists(path):
+        return {"names": [], "lat": [], "lon": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_sites(root, sites):
+    tmp = _sites_path(root) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sites, f, separators=(",", ":"))
+    os.replace(tmp, _sites_path(root))
+
+
+def _segments(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if name.startswith("seg-") and name.endswith(".npz"))
+
+
+def _write_segment(root, columns):
+    names = _segments(root)
+    number = int(names[-1][4:-4]) + 1 if names else 1
+    path = os.path.join(root, f"seg-{number:06d}.npz")
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(tmp, **columns)
+    os.replace(tmp, path)
+    return path
+
+
+def _read_segments(root):
+    while True:
+        names = _segments(root)
+        try:
+            parts = []
+            for name in names:
+                with np.load(os.path.join(root, name), allow_pickle=False) as npz:
+                    parts.append({key: npz[key] for key in npz.files})
+            return names, parts
+        except FileNotFoundError:
+            continue  # compacted while we were reading; list again
+
+
+def _merge(parts):
+    """Segments -> one set of columns sorted by (site, day), newest segment winning."""
+    columns = {key: np.concatenate([p[key] for p in parts]) for key in ("site", "day", "level", "cells")}
+    segment = np.concatenate([np.full(len(p["site"]), i, dtype=np.int32) for i, p in enumerate(parts)])
+    order = np.lexsort((segment, columns["day"], columns["site"]))
+    columns = {key: values[order] for key, values in columns.items()}
+    site, day = columns["site"], columns["day"]
+    keep = np.r_[(site[1:] != site[:-1]) | (day[1:] != day[:-1]), True]
+    return {key: values[keep] for key, values in columns.items()}
+
+
+def load_samples(root=None):
+    """
+    The merged series, or None before the first ingest. Rows are sorted by (site, day);
+    'site' indexes 'sites' / 'site_lat' / 'site_lon', 'day' is days since 1970-01-01,
+    and site s's rows are offsets[s]:offsets[s + 1].
+    """
+    root = root or RED_TIDE_STORE_DIR
+    names, parts = _read_segments(root)
+    if not parts:
+        return None
+    sites = _read_sites(root)  # written before any segment that uses its ids
+    merged = _merge(parts)
+    site_lat = np.array(sites["lat"], dtype=np.float32)
+    site_lon = np.array(sites["lon"], dtype=np.float32)
+    site = merged["site"]
+    return {
+        "sites": np.array(sites["names"], dtype=str),
+        "site_lat": site_lat,
+        "site_lon": site_lon,
+        "offsets": np.searchsorted(site, np.arange(len(site_lat) + 1)),
+        "site": site,
+        "lat": site_lat[site],
+        "lon": site_lon[site],
+        "day": merged["day"] + np.int32(SERIES_EPOCH_DAY),
+        "level": merged["level"],
+        "cells": merged["cells"],
+        "segments": len(names),
+    }
+
+
+def _sample_keys(site, day):
+    return site.astype(np.int64) * 10_000_000 + day
+
+
+def ingest(root=None):
+    """
+    Pull samples dated on/after the newest stored day (one day of overlap for late
+    uploads) and append the new or revised ones as a segment. Returns the number of
+    samples appended.
+    """
+    root = root or RED_TIDE_STORE_DIR
+    os.makedirs(root, exist_ok=True)
+    previous = load_samples(root)
+    since = int(previous["day"].max()) - 1 if previous is not None and len(previous["day"]) else None
+
+    fresh = fetch_samples(since)
+    if since is not None:
+        fresh = fresh[fresh["day"] >= since]
+    fresh = fresh.drop_duplicates(subset=["site", "day"], keep="last")
+    if fresh.empty:
+        return 0
+
+    # extend the site dictionary; a site keeps the position it was first seen at
+    sites = _read_sites(root)
+    ids = {name: i for i, name in enumerate(sites["names"])}
+    first_seen = fresh.drop_duplicates(subset="site")
+    new_sites = first_seen[~first_seen["site"].isin(ids)]
+    if len(new_sites):
+        for name, lat, lon in zip(new_sites["site"], new_sites["lat"], new_sites["lon"]):
+            ids[name] = len(sites["names"])
+            sites["names"].append(name)
+            sites["lat"].append(round(float(lat), 6))
+            sites["lon"].append(round(float(lon), 6))
+        _write_sites(root, sites)
+
+    site = fresh["site"].map(ids).to_numpy(dtype=np.int32)
+    day = fresh["day"].to_numpy(dtype=np.int32)
+    level = fresh["level"].to_numpy(dtype=np.int8)
+    cells = fresh["cells"].to_numpy(dtype=np.float32)
+
+    # the overlap day comes back every run: drop samples already stored as-is
+    if previous is not None:
+        stored = _sample_keys(previous["site"], previous["day"])
+        keys = _sample_keys(site, day)
+        at = np.minimum(np.searchsorted(stored, keys), len(stored) - 1)
+        found = stored[at] == keys
+        same_cells = (previous["cells"][at] == cells) | (np.isnan(previous["cells"][at]) & np.isnan(cells))
+        new = ~(found & (previous["level"][at] == level) & same_cells)
+        site, day, level, cells = site[new], day[new], level[new], cells[new]
+    if not len(site):
+        return 0
+
+    _write_segment(root, {"site": site, "day": day - np.int32(SERIES_EPOCH_DAY), "level": level, "cells": cells})
+    if len(_segments(root)) > RED_TIDE_MAX_SEGMENTS:
+        compact(root)
+    return len(site)
+
+
+def compact(root=None):
+    """Merge every segment into one (readers see the same series before and after)."""
+    root = root or RED_TIDE_STORE_DIR
+    names, parts = _read_segments(root)
+    if len(parts) < 2:
+        return len(parts)
+    _write_segment(root, _merge(parts))
+    for name in names:
+        os.remove(os.path.join(root, name))
+    return 1
+
+
+# -----------------------------
+# Beach join
+# -----------------------------
+def beach_status(samples, lats, lons, radius_miles=RED_TIDE_RADIUS_MILES):
+    """
+    For each beach: the worst (then nearest) site within the radius, using each
+    site's latest sample in the lookback window. Returns a list of dicts / None.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    out = [None] * len(lats)
+    if samples is None or not len(samples["day"]):
+        return out
+
+    recent = np.flatnonzero(samples["day"] >= samples["day"].max() - RED_TIDE_LOOKBACK_DAYS)
+    # latest sample per site: rows are sorted by (site, day), so it ends each site's run
+    site = samples["site"][recent]
+    latest = recent[np.r_[site[1:] != site[:-1], True]]
+
+    index = GridIndex(samples["lat"][latest], samples["lon"][latest], cell_deg=0.1)
+    beach, hit, dist = index.pairs_within(lats, lons, radius_miles)
+    if not len(beach):
+        return out
+
+    rows = latest[hit]
+    levels = samples["level"][rows]
+    order = np.lexsort((dist, -levels, beach))
+    beach, rows, dist, levels = beach[order], rows[order], dist[order], levels[order]
+    first = np.flatnonzero(np.r_[True, beach[1:] != beach[:-1]])
+    counts = np.diff(np.r_[first, len(beach)])
+
+    for i, n in zip(first, counts):
+        r = rows[i]
+        cells = samples["cells"][r]
+        out[beach[i]] = {
+            "abundance": str(ABUNDANCE_LEVELS[levels[i]]),
+            "karena_brevis_risk": int(RISK_SCORES[levels[i]]),
+            "cells_per_liter": None if np.isnan(cells) else float(cells),
+            "site": str(samples["sites"][samples["site"][r]]),
+            "distance_miles": round(float(dist[i]), 2),
+            "sample_date": str(np.datetime64(int(samples["day"][r]), "D")),
+            "sites_in_range": int(n),
+            "estimated": False,
+        }
+    return out
+
+
+def refresh_status(beaches, path=None):
+    """Precompute the status of every beach [(mapbox_id, lat, lon)] into the status file."""
+    path = path or RED_TIDE_STATUS_PATH
+    statuses = beach_status(load_samples(), [b[1] for b in beaches], [b[2] for b in beaches])
+    payload = {
+        "generated": datetime.now(timezone.utc).isoformat(),
+        "radius_miles": RED_TIDE_RADIUS_MILES,
+        "beaches": {str(b[0]): s for b, s in zip(beaches, statuses) if s is not None},
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return len(payload["beaches"])
+
+
+# -----------------------------
+# History
+# -----------------------------
+def _cached_samples():
+    """load_samples() for the app: re-read only when an ingest or compaction changed the store."""
+    try:
+        key = (tuple(_segments(RED_TIDE_STORE_DIR)), os.path.getmtime(_sites_path(RED_TIDE_STORE_DIR)))
+    except OSError:
+        return None
+    if _series['key'] != key:
+        with _status_lock:
+            if _series['key'] != key:
+                samples = load_samples()
+                if samples is not None:
+                    samples["index"] = GridIndex(samples["site_lat"], samples["site_lon"], cell_deg=0.1)
+                _series['data'], _series['key'] = samples, key
+    return _series['data']
+
+
+def history(lat, lon, start_day, end_day, radius_miles=RED_TIDE_RADIUS_MILES, samples=None):
+    """
+    Weekly (Monday to Sunday) K. brevis aggregates over the sample sites within
+    radius_miles of (lat, lon), for sample days start_day..end_day inclusive (days
+    since 1970-01-01). Returns (sites, weeks), sites nearest first, weeks ascending.
+    """
+    samples = _cached_samples() if samples is None else samples
+    if samples is None:
+        return [], []
+    index = samples.get("index")
+    if index is None:
+        index = GridIndex(samples["site_lat"], samples["site_lon"], cell_deg=0.1)
+    near, dist = index.query_radius(lat, lon, radius_miles)
+    by_distance = np.argsort(dist, kind="stable")
+    near, dist = near[by_distance], dist[by_distance]
+    sites = [
+        {"site": str(samples["sites"][s]), "distance_miles": round(float(d), 2)}
+        for s, d in zip(near, dist)
+    ]
+
+    # each site's rows are sorted by day: two binary searches give the range
+    offsets, day = samples["offsets"], samples["day"]
+    ranges = []
+    for s in near:
+        a, b = offsets[s], offsets[s + 1]
+        lo, hi = a + np.searchsorted(day[a:b], [start_day, end_day + 1])
+        ranges.append(np.arange(lo, hi))
+    rows = np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+    if not len(rows):
+        return sites, []
+
+    days = day[rows].astype(np.int64)
+    levels = samples["level"][rows]
+    cells = samples["cells"][rows].astype(np.float64)
+    # 1970-01-01 was a Thursday: step back to the Monday of each sample's week
+    week_start, inverse = np.unique(days - (days + 3) % 7, return_inverse=True)
+    n_weeks = len(week_start)
+    count = np.bincount(inverse, minlength=n_weeks)
+    n_sites = len(samples["sites"])
+    site_weeks = np.unique(inverse * n_sites + samples["site"][rows])
+    site_count = np.bincount(site_weeks // n_sites, minlength=n_weeks)
+    max_level = np.zeros(n_weeks, dtype=np.int8)
+    np.maximum.at(max_level, inverse, levels)
+    mean_level = np.bincount(inverse, weights=levels, minlength=n_weeks) / count
+
+    known = ~np.isnan(cells)
+    cell_count = np.bincount(inverse[known], minlength=n_weeks)
+    cell_sum = np.bincount(inverse[known], weights=cells[known], minlength=n_weeks)
+    max_cells = np.full(n_weeks, np.nan)
+    np.fmax.at(max_cells, inverse[known], cells[known])
+
+    weeks = []
+    for w in range(n_weeks):
+        weeks.append({
+            "week_start": str(np.datetime64(int(week_start[w]), "D")),
+            "samples": int(count[w]),
+            "sites": int(site_count[w]),
+            "max_abundance": str(ABUNDANCE_LEVELS[max_level[w]]),
+            "max_karena_brevis_risk": int(RISK_SCORES[max_level[w]]),
+            "mean_level": round(float(mean_level[w]), 2),
+            "max_cells_per_liter": None if not cell_count[w] else float(max_cells[w]),
+            "mean_cells_per_liter": None if not cell_count[w] else round(float(cell_sum[w] / cell_count[w]), 1),
+        })
+    return sites, weeks
+
+
+# -----------------------------
+# Interpolated raster
+# -----------------------------
+def build_grid(samples=None, path=None, chunk=20_000):
+    """
+    Inverse-distance-weighted abundance level for every cell of the Florida grid,
+    from all samples in the lookback window; older samples count less (half-life
+    IDW_HALF_LIFE_DAYS). Cells with no sample within IDW_MAX_MILES are NaN.
+    Returns the grid shape.
+    """
+    path = path or RED_TIDE_GRID_PATH
+    samples = load_samples() if samples is None else samples
+    min_lat, min_lon, max_lat, max_lon = RED_TIDE_GRID_BBOX
+    n_lat = int(np.ceil((max_lat - min_lat) / RED_TIDE_GRID_DEG))
+    n_lon = int(np.ceil((max_lon - min_lon) / RED_TIDE_GRID_DEG))
+    level = np.full(n_lat * n_lon, np.nan, dtype=np.float32)
+    support = np.zeros(n_lat * n_lon, dtype=np.float32)  # summed weight, a rough confidence
+
+    if samples is not None and len(samples["day"]):
+        newest = samples["day"].max()
+        use = samples["day"] >= newest - RED_TIDE_LOOKBACK_DAYS
+        s_lat = samples["lat"][use].astype(np.float64)
+        s_lon = samples["lon"][use].astype(np.float64)
+        s_level = samples["level"][use].astype(np.float64)
+        decay = 0.5 ** ((newest - samples["day"][use]) / IDW_HALF_LIFE_DAYS)
+
+        # cell centers, row-major
+        lat_c = min_lat + (np.arange(n_lat) + 0.5) * RED_TIDE_GRID_DEG
+        lon_c = min_lon + (np.arange(n_lon) + 0.5) * RED_TIDE_GRID_DEG
+        for start in range(0, n_lat * n_lon, chunk):
+            cells = np.arange(start, min(start + chunk, n_lat * n_lon))
+            c_lat = lat_c[cells // n_lon][:, None]
+            c_lon = lon_c[cells % n_lon][:, None]
+            dist = haversine_miles(c_lat, c_lon, s_lat[None, :], s_lon[None, :])
+            weight = np.where(dist <= IDW_MAX_MILES, decay / np.maximum(dist, IDW_MIN_MILES) ** IDW_POWER, 0.0)
+            total = weight.sum(axis=1)
+            covered = total > 0
+            level[cells[covered]] = (weight[covered] @ s_level) / total[covered]
+            support[cells] = total
+
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(
+        tmp, level=level.reshape(n_lat, n_lon), support=support.reshape(n_lat, n_lon),
+        bbox=np.array(RED_TIDE_GRID_BBOX), deg=np.array(RED_TIDE_GRID_DEG),
+        newest_day=np.array(samples["day"].max() if samples is not None and len(samples["day"]) else 0)
+    )
+    os.replace(tmp, path)
+    return n_lat, n_lon
+
+
+def _load_cached(cache, path, loader):
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if cache['mtime'] != mtime:
+        with _status_lock:
+            if cache['mtime'] != mtime:
+                cache['data'], cache['mtime'] = loader(path), mtime
+    return cache['data']
+
+
+def _read_grid(path):
+    with np.load(path, allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def _read_status(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def estimate(lat, lon):
+    """Interpolated red tide status at any point: one raster cell read, or None off-grid/uncovered."""
+    grid = _load_cached(_grid, RED_TIDE_GRID_PATH, _read_grid)
+    if grid is None:
+        return None
+    min_lat, min_lon = grid["bbox"][0], grid["bbox"][1]
+    i = int((lat - min_lat) // grid["deg"])
+    j = int((lon - min_lon) // grid["deg"])
+    if not (0 <= i < grid["level"].shape[0] and 0 <= j < grid["level"].shape[1]):
+        return None
+    value = grid["level"][i, j]
+    if np.isnan(value):
+        return None
+
+    level = int(np.rint(value))
+    return {
+        "abundance": str(ABUNDANCE_LEVELS[level]),
+        "karena_brevis_risk": int(RISK_SCORES[level]),
+        "cells_per_liter": None,
+        "site": None,
+        "distance_miles": None,
+        "sample_date": str(np.datetime64(int(grid["newest_day"]), "D")),
+        "interpolated_level": round(float(value), 2),
+        "estimated": True,
+    }
+
+
+def preload():
+    """Load the status file, raster and sample series now rather than on first request."""
+    return {
+        "status": _load_cached(_status, RED_TIDE_STATUS_PATH, _read_status) is not None,
+        "grid": _load_cached(_grid, RED_TIDE_GRID_PATH, _read_grid) is not None,
+        "samples": _cached_samples() is not None,
+    }
+
+
+def get_status(mapbox_id, lat=None, lon=None):
+    """
+    Red tide status for a beach: the precomputed sample join when the beach has
+    samples in range, otherwise the interpolated raster estimate at (lat, lon).
+    """
+    status = _load_cached(_status, RED_TIDE_STATUS_PATH, _read_status)
+    if status and str(mapbox_id) in status["beaches"]:
+        return status["beaches"][str(mapbox_id)]
+    if lat is None or lon is None:
+        return None
+    return estimate(lat, lon)
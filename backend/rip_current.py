@@ -4,8 +4,17 @@ import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 import math
-from bs4 import BeautifulSoup
 import re
+import threading
+
+import numpy as np
+
+from spatial import GridIndex
+
+# The NOAA station catalog changes rarely; it is fetched once per process and refreshed after this long
+STATION_CATALOG_TTL = timedelta(hours=int(os.getenv("STATION_CATALOG_TTL_H", "24")))
+# After a failed fetch, wait this long before trying again (the old catalog, if any, keeps serving)
+STATION_CATALOG_RETRY = timedelta(minutes=int(os.getenv("STATION_CATALOG_RETRY_MIN", "5")))
 
 class NOAAMarineData:
     """
@@ -25,6 +34,12 @@ class NOAAMarineData:
         ttl_min = int(os.getenv("RIPCACHE_TTL_MIN", "10"))
         self._ttl = timedelta(minutes=ttl_min)
         self._cache = {}  # key -> {'data': <dict>, 'ts': datetime}
+
+        # Station catalog as arrays + grid index: {'stations', 'index', 'ts'}
+        self._catalog = None
+        self._catalog_failed_at = None
+        self._catalog_refreshing = False
+        self._catalog_lock = threading.Lock()  # guards the three fields above, never held across a fetch
         
     # Cache Helpers
     def _key(self, lat: float, lon: float) -> str:
@@ -47,6 +62,10 @@ class NOAAMarineData:
         self._cache[key] = {'data': data, 'ts': datetime.utcnow()}
         print(f"[CACHE SET] {self._key(lat, lon)}")
 
+    def get_cached_risk(self, lat: float, lon: float) -> Optional[Dict]:
+        """Cached assessment for a point, or None; never calls NOAA"""
+        return self._get_cached(lat, lon)
+
     def invalidate(self, lat: float, lon: float):
         self._cache.pop(self._key(lat, lon), None)
     
@@ -166,42 +185,81 @@ class NOAAMarineData:
             print(f"Error fetching surf conditions: {e}")
             return None
     
+    def _catalog_due(self, now) -> bool:
+        if self._catalog_failed_at is not None and now - self._catalog_failed_at < STATION_CATALOG_RETRY:
+            return False
+        return self._catalog is None or now - self._catalog['ts'] >= STATION_CATALOG_TTL
+
+    def _fetch_station_catalog(self) -> Dict:
+        params = {
+            'product': 'stations',
+            'application': 'YourAppName',
+            'format': 'json'
+        }
+        # plain request, not self.session: this may run in the gunicorn master
+        # before fork, and workers must not inherit its pooled connection
+        response = requests.get(self.base_url, params=params, headers=self.session.headers, timeout=30)
+        response.raise_for_status()
+
+        stations, lats, lons = [], [], []
+        for station in response.json().get('stations', []):
+            try:
+                lat, lon = float(station.get('lat', 0)), float(station.get('lng', 0))
+            except (ValueError, TypeError):
+                continue
+            stations.append(station)
+            lats.append(lat)
+            lons.append(lon)
+
+        return {
+            'stations': stations,
+            'index': GridIndex(np.array(lats), np.array(lons), cell_deg=0.5),
+            'ts': datetime.now(),
+        }
+
+    def load_station_catalog(self) -> int:
+        """
+        Fetch the NOAA station list into a grid index when it is missing or older than
+        STATION_CATALOG_TTL. One thread fetches while the others keep using the current
+        (possibly stale) catalog; after a failure nobody retries for STATION_CATALOG_RETRY.
+        Returns the catalog size; raises if this call's fetch failed.
+        """
+        with self._catalog_lock:
+            if self._catalog_refreshing or not self._catalog_due(datetime.now()):
+                return len(self._catalog['stations']) if self._catalog else 0
+            self._catalog_refreshing = True
+
+        try:
+            catalog = self._fetch_station_catalog()
+        except Exception:
+            with self._catalog_lock:
+                self._catalog_failed_at = datetime.now()
+                self._catalog_refreshing = False
+            raise
+
+        with self._catalog_lock:
+            self._catalog = catalog
+            self._catalog_failed_at = None
+            self._catalog_refreshing = False
+        return len(catalog['stations'])
+
     def find_nearby_stations(self, lat: float, lon: float, radius: int = 50) -> List[Dict]:
-        """Find NOAA stations within specified radius (miles)"""
+        """Find NOAA stations within specified radius (miles), nearest first"""
         try:
-            params = {
-                'product': 'stations',
-                'application': 'YourAppName',
-                'format': 'json'
-            }
-            
-            response = self.session.get(self.base_url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            nearby_stations = []
-            stations = data.get('stations', [])
-            
-            for station in stations:
-                try:
-                    station_lat = float(station.get('lat', 0))
-                    station_lon = float(station.get('lng', 0))
-                    distance = self.calculate_distance(lat, lon, station_lat, station_lon)
-                    
-                    if distance <= radius:
-                        station['distance'] = distance
-                        nearby_stations.append(station)
-                except (ValueError, TypeError):
-                    continue
-            
-            # Sort by distance
-            nearby_stations.sort(key=lambda x: x.get('distance', float('inf')))
-            return nearby_stations
-            
+            self.load_station_catalog()
         except requests.RequestException as e:
             print(f"Error finding nearby stations: {e}")
+
+        catalog = self._catalog
+        if catalog is None:
             return []
-    
+        rows, dists = catalog['index'].query_radius(lat, lon, radius)
+        order = np.argsort(dists, kind="stable")
+        return [
+            {**catalog['stations'][row], 'distance': float(dist)}
+            for row, dist in zip(rows[order], dists[order])
+        ]
+
     def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate distance between two coordinates in miles"""
         R = 3959  # Earth's radius in miles
@@ -0,0 +1,23 @@
+from supabase_client import init_supabase
+from air_quality import refresh_air_quality, AIR_QUALITY_SNAPSHOT_PATH
+
+supabase = init_supabase()
+
+if __name__ == "__main__":
+    # Run on a schedule (more often than AIR_QUALITY_CACHE_TTL_MIN); workers pick up
+    # the new snapshot on their next air quality request
+    beach_data = supabase.table('beaches').select('mapbox_id, location').execute()
+    if not beach_data.data:
+        print("No beaches found")
+        exit(1)
+
+    coords = []
+    for beach in beach_data.data:
+        try:
+            lat_str, lon_str = beach['location'].split(",")
+            coords.append((float(lat_str.strip()), float(lon_str.strip())))
+        except (AttributeError, ValueError):
+            print(f"Beach {beach['mapbox_id']} has no usable location")
+
+    refresh_air_quality(coords)
+    print(f"Air quality: {len(coords)} beaches refreshed -> {AIR_QUALITY_SNAPSHOT_PATH}")
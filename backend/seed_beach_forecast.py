@@ -1,7 +1,7 @@
 import os
 from supabase_client import init_supabase
 from datetime import datetime, timezone, timedelta
-from daily_beach_forecast_backend import get_beach_forecast
+from daily_beach_forecast_backend import get_beach_forecasts
 from dotenv import load_dotenv
 
 supabase = init_supabase()
@@ -19,24 +19,30 @@ HEADERS = {
 }
 
 if __name__ == "__main__":
-    beach_data = supabase.table('beaches').select('*').execute()
+    beach_data = supabase.table('beaches').select('mapbox_id, location').execute()
     if not beach_data.data:
         print("No beaches found")
         exit(1)
 
+    beaches = []
     for beach in beach_data.data:
-        mapbox_id = beach['mapbox_id']
-        lat_str, lon_str = beach['location'].split(",")
-        lat, lon = float(lat_str.strip()), float(lon_str.strip())
-        forecasts = get_beach_forecast(lat, lon)
+        try:
+            lat_str, lon_str = beach['location'].split(",")
+            beaches.append((beach['mapbox_id'], float(lat_str.strip()), float(lon_str.strip())))
+        except (AttributeError, ValueError):
+            print(f"Beach {beach['mapbox_id']} has no usable location")
 
-        if not len(forecasts):
+    # One multi-location request per batch instead of three calls per beach
+    all_forecasts = get_beach_forecasts([(lat, lon) for _, lat, lon in beaches])
+
+    for (mapbox_id, _, _), forecasts in zip(beaches, all_forecasts):
+        if not forecasts:
             print(f"Beach {mapbox_id} forecast not found")
             continue
 
         supabase.table('beaches').update({
-            'forecast': forecasts,
+            'forecast': forecasts.to_columnar(),
             'last_updated': datetime.now(timezone.utc).isoformat()
         }).eq('mapbox_id', mapbox_id).execute()
 
-        print(f"Beach {mapbox_id} forecast updated")
\ No newline at end of file
+        print(f"Beach {mapbox_id} forecast updated")
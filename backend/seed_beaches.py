@@ -1,8 +1,10 @@
+import argparse
 import json
 import os
 import requests
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,12 +19,35 @@ HEADERS = {
     "Prefer": "return=representation"
 }
 
+# Rows per upsert request and upsert requests in flight
+BEACH_SEED_BATCH_SIZE = int(os.environ.get("BEACH_SEED_BATCH_SIZE", 500))
+BEACH_SEED_WORKERS = int(os.environ.get("BEACH_SEED_WORKERS", 4))
+BEACH_SEED_RETRIES = 3
+
 def insert_row(table, payload):
     url = f"{SUPABASE_URL}/rest/v1/{table}"
     response = requests.post(url, headers=HEADERS, json=payload)
     response.raise_for_status()
     return response.json()
 
+def upsert_rows(table, rows, key="mapbox_id"):
+    """
+    Insert-or-update a batch in one request: rows whose `key` already exists are
+    updated in place, so seeding twice never creates duplicates. `key` needs a
+    unique index (migrations/001_beaches_mapbox_id_unique.sql for beaches).
+    Retries 429/5xx with jittered backoff.
+    """
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    headers = {**HEADERS, "Prefer": "resolution=merge-duplicates,return=minimal"}
+    for attempt in range(BEACH_SEED_RETRIES):
+        response = requests.post(url, headers=headers, params={"on_conflict": key}, json=rows, timeout=60)
+        retryable = response.status_code == 429 or response.status_code >= 500
+        if not retryable or attempt == BEACH_SEED_RETRIES - 1:
+            break
+        time.sleep(2 ** attempt + random.random())
+    response.raise_for_status()
+    return len(rows)
+
 def delete_all_beaches():
     """Delete all records from the beaches table"""
     url = f"{SUPABASE_URL}/rest/v1/beaches"
@@ -31,42 +56,83 @@ def delete_all_beaches():
     response.raise_for_status()
     print("All beaches deleted from database")
 
+def iter_features(geojson_path):
+    """
+    Features one at a time. With ijson installed the file is parsed incrementally;
+    otherwise it falls back to json.load.
+    """
+    with open(geojson_path, "rb") as f:
+        try:
+            import ijson
+        except ImportError:
+            yield from json.load(f).get("features", [])
+            return
+        yield from ijson.items(f, "features.item", use_float=True)
+
+def representative_point(geometry):
+    """
+    (lon, lat) for any GeoJSON geometry: the point itself, the middle vertex of a
+    line, or the vertex average of the outer ring of the (largest) polygon.
+    """
+    kind = geometry["type"]
+    coords = geometry["coordinates"]
+    if kind == "Point":
+        return coords[0], coords[1]
+    if kind == "LineString":
+        return tuple(coords[len(coords) // 2][:2])
+    if kind == "MultiLineString":
+        line = max(coords, key=len)
+        return tuple(line[len(line) // 2][:2])
+    if kind == "MultiPoint":
+        rings = [coords]
+    elif kind == "Polygon":
+        rings = [coords[0]]
+    elif kind == "MultiPolygon":
+        rings = [polygon[0] for polygon in coords if polygon]
+    else:
+        raise ValueError(f"Unsupported geometry {kind}")
+
+    def bbox_area(ring):
+        lons = [p[0] for p in ring]
+        lats = [p[1] for p in ring]
+        return (max(lons) - min(lons)) * (max(lats) - min(lats))
+
+    ring = max((r for r in rings if r), key=bbox_area)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]  # closing vertex repeats the first
+    return sum(p[0] for p in ring) / len(ring), sum(p[1] for p in ring) / len(ring)
+
 def format_feature(feature):
     try:
-        coords = feature["geometry"]["coordinates"]
-        if len(coords) < 2:
+        geometry = feature["geometry"]
+        if not geometry or not geometry.get("coordinates"):
             raise ValueError("Invalid coordinates")
 
-        lat = coords[1]
-        lon = coords[0]
+        lon, lat = representative_point(geometry)
         name = feature["properties"].get("name") or feature["properties"].get("place_name")
         if not name:
             raise ValueError("No name or place_name found")
-        
+
         # Remove comma and everything after it if present
         if "," in name:
             name = name.split(",")[0].strip()
-        
+
         # Priority-based mapbox_id setting
         mapbox_id = None
-        
-        # First, check if @id exists
+
+        # First, check if @id exists. This is the key every seeded beach (and its
+        # comments/pictures) already has: "node/123" -> "123", but "way/456" -> "56"
+        # and "relation/789" -> "ion/789". Changing it would re-insert those beaches.
         at_id = feature["properties"].get("@id")
         if at_id and len(at_id) > 5:
-            try:
-                mapbox_id = at_id[5:]
-            except ValueError:
-                pass  # Continue to next check if conversion fails
-        
+            mapbox_id = at_id[5:]
+
         # If no valid @id, check if mapbox_id already exists
         if mapbox_id is None:
             existing_mapbox_id = feature["properties"].get("mapbox_id")
             if existing_mapbox_id is not None:
-                try:
-                    mapbox_id = existing_mapbox_id
-                except (ValueError, TypeError):
-                    pass
-        
+                mapbox_id = str(existing_mapbox_id)
+
         location = f"{lat}, {lon}"
 
         beach_data = {
@@ -78,35 +144,80 @@ def format_feature(feature):
 
         return beach_data
 
-    except (KeyError, TypeError, ValueError) as e:
+    except (KeyError, TypeError, ValueError, IndexError) as e:
         print(f"Skipping invalid feature: {e}")
         return None
 
-
-def seed_beaches(geojson_path, reset=False):
-    if reset:
-        print("Resetting database...")
-        delete_all_beaches()
-    
-    with open(geojson_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    features = data.get("features", [])
-    total = 0
-
+def iter_batches(features, batch_size, counts):
+    """Formatted beaches in batches, each mapbox_id once (the first feature wins)."""
+    seen = set()
+    batch = []
     for feature in features:
         beach = format_feature(feature)
         if not beach:
+            counts['invalid'] += 1
             continue
-        try:
-            insert_row("beaches", beach)
-            total += 1
-            print(f"Inserted: {beach['name']}")
-        except Exception as e:
-            print(f"Failed: {beach['name']}\n{e}")
+        if beach["mapbox_id"] is None:
+            counts['no_id'] += 1  # nothing to upsert on
+            continue
+        if beach["mapbox_id"] in seen:
+            counts['duplicate'] += 1
+            continue
+        seen.add(beach["mapbox_id"])
+        batch.append(beach)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _collect(future, batch, counts, report):
+    try:
+        report(future.result())
+    except Exception as e:
+        counts['failed'] += len(batch)
+        print(f"Failed batch of {len(batch)} ({batch[0]['name']} ...)\n{e}")
+
+def seed_beaches(geojson_path, reset=False, batch_size=BEACH_SEED_BATCH_SIZE, workers=BEACH_SEED_WORKERS):
+    if reset:
+        print("Resetting database...")
+        delete_all_beaches()
 
-    print(f"\n Done! {total} beaches seeded.")
+    counts = {'upserted': 0, 'failed': 0, 'invalid': 0, 'no_id': 0, 'duplicate': 0}
+    started = time.perf_counter()
+
+    def report(done):
+        counts['upserted'] += done
+        rate = counts['upserted'] / max(time.perf_counter() - started, 1e-9)
+        print(f"Upserted {counts['upserted']} beaches ({rate:.0f} rows/s)")
+
+    # Batches are sent while the file is still being parsed; at most 2x workers are
+    # queued so memory stays flat however large the file is
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for batch in iter_batches(iter_features(geojson_path), batch_size, counts):
+            if len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    _collect(future, pending.pop(future), counts, report)
+            pending[pool.submit(upsert_rows, "beaches", batch)] = batch
+        for future in list(pending):
+            _collect(future, pending.pop(future), counts, report)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"\n Done! {counts['upserted']} beaches seeded in {elapsed:.1f}s "
+        f"({counts['upserted'] / max(elapsed, 1e-9):.0f} rows/s); "
+        f"{counts['failed']} failed, {counts['invalid']} invalid, "
+        f"{counts['no_id']} without an id, {counts['duplicate']} duplicate ids skipped."
+    )
+    return counts
 
 if __name__ == "__main__":
-    # Set reset=True to clear database before seeding
-    seed_beaches("fl beaches.geojson", reset=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Upsert beaches from a GeoJSON file into Supabase")
+    parser.add_argument("geojson", nargs="?", default="fl beaches.geojson")
+    parser.add_argument("--reset", action="store_true", help="clear the beaches table before seeding")
+    parser.add_argument("--batch-size", type=int, default=BEACH_SEED_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=BEACH_SEED_WORKERS)
+    args = parser.parse_args()
+    seed_beaches(args.geojson, reset=args.reset, batch_size=args.batch_size, workers=args.workers)
@@ -0,0 +1,25 @@
+import sys
+from supabase_client import init_supabase
+from parking_recommendations import refresh, PARKING_RECS_PATH
+
+supabase = init_supabase()
+
+if __name__ == "__main__":
+    # --full recomputes every beach; otherwise only beaches touched by CSV/location changes
+    full = "--full" in sys.argv[1:]
+
+    beach_data = supabase.table('beaches').select('mapbox_id, location').execute()
+    if not beach_data.data:
+        print("No beaches found")
+        exit(1)
+
+    beaches = []
+    for beach in beach_data.data:
+        try:
+            lat_str, lon_str = beach['location'].split(",")
+            beaches.append((beach['mapbox_id'], float(lat_str.strip()), float(lon_str.strip())))
+        except (AttributeError, ValueError):
+            print(f"Beach {beach['mapbox_id']} has no usable location")
+
+    recomputed = refresh(beaches, full=full)
+    print(f"Parking recommendations: {recomputed}/{len(beaches)} beaches recomputed -> {PARKING_RECS_PATH}")
@@ -0,0 +1,30 @@
+from supabase_client import init_supabase
+from red_tide import ingest, build_grid, refresh_status, RED_TIDE_STORE_DIR, RED_TIDE_STATUS_PATH, RED_TIDE_GRID_PATH
+
+supabase = init_supabase()
+
+if __name__ == "__main__":
+    # 1. pull new FWC samples (only dates we don't have yet)
+    added = ingest()
+    print(f"Red tide samples: {added} appended -> {RED_TIDE_STORE_DIR}")
+
+    # 2. interpolated raster, so any point gets an estimate with one cell read
+    n_lat, n_lon = build_grid()
+    print(f"Red tide grid: {n_lat}x{n_lon} cells -> {RED_TIDE_GRID_PATH}")
+
+    # 3. join every beach to the samples around it
+    beach_data = supabase.table('beaches').select('mapbox_id, location').execute()
+    if not beach_data.data:
+        print("No beaches found")
+        exit(1)
+
+    beaches = []
+    for beach in beach_data.data:
+        try:
+            lat_str, lon_str = beach['location'].split(",")
+            beaches.append((beach['mapbox_id'], float(lat_str.strip()), float(lon_str.strip())))
+        except (AttributeError, ValueError):
+            print(f"Beach {beach['mapbox_id']} has no usable location")
+
+    covered = refresh_status(beaches)
+    print(f"Red tide status: {covered}/{len(beaches)} beaches have samples in range -> {RED_TIDE_STATUS_PATH}")
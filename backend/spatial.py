@@ -0,0 +1,135 @@
+# Vectorized geo helpers shared by the ranking, parking and red tide code
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+
+
+def haversine_miles(lat, lon, lats, lons):
+    """Great-circle distance in miles from one point to arrays of points (or element-wise)."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat, lon, radius_miles):
+    """(min_lat, min_lon, max_lat, max_lon) box that contains the radius circle."""
+    dlat = radius_miles / MILES_PER_DEGREE_LAT
+    dlon = radius_miles / (MILES_PER_DEGREE_LAT * max(np.cos(np.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def in_box(lats, lons, box):
+    min_lat, min_lon, max_lat, max_lon = box
+    return (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid over a fixed set of points. Rows are sorted by cell
+    key so every latitude band of a query box is one searchsorted slice;
+    radius queries only compute distances for points in nearby cells.
+    """
+
+    _OFFSET = 1 << 20  # keeps cell indices positive for any lat/lon
+
+    def __init__(self, lats, lons, cell_deg=0.05):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_deg = cell_deg
+        keys = self._keys(np.floor(self.lats / cell_deg), np.floor(self.lons / cell_deg))
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _keys(self, ilat, ilon):
+        return (ilat.astype(np.int64) + self._OFFSET) * (2 * self._OFFSET) + (ilon.astype(np.int64) + self._OFFSET)
+
+    def candidates(self, box):
+        """Row ids of every point in the cells overlapping `box` (a superset of in_box)."""
+        min_lat, min_lon, max_lat, max_lon = box
+        lat0, lat1 = int(np.floor(min_lat / self.cell_deg)), int(np.floor(max_lat / self.cell_deg))
+        lon0, lon1 = int(np.floor(min_lon / self.cell_deg)), int(np.floor(max_lon / self.cell_deg))
+        bands = np.arange(lat0, lat1 + 1)
+        lo = np.searchsorted(self.keys, self._keys(bands, np.full(len(bands), lon0)), side="left")
+        hi = np.searchsorted(self.keys, self._keys(bands, np.full(len(bands), lon1)), side="right")
+        if not len(bands) or not (hi > lo).any():
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate([self.order[a:b] for a, b in zip(lo, hi) if b > a]))
+
+    def query_radius(self, lat, lon, radius_miles, mask=None):
+        """
+        (row ids, distances in miles) of points within the radius, in row order.
+        `mask` (bool per point) drops rows before any distance is computed.
+        """
+        rows = self.candidates(bounding_box(lat, lon, radius_miles))
+        if mask is not None:
+            rows = rows[mask[rows]]
+        dist = haversine_miles(lat, lon, self.lats[rows], self.lons[rows])
+        keep = dist <= radius_miles
+        return rows[keep], dist[keep]
+
+    def nearest(self, lat, lon, k, mask=None):
+        """(row ids, distances) of the k nearest points (among `mask`), closest first."""
+        k = min(k, len(self) if mask is None else int(np.count_nonzero(mask)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        radius = self.cell_deg * MILES_PER_DEGREE_LAT
+        while True:
+            rows, dist = self.query_radius(lat, lon, radius, mask=mask)
+            # a hit count of k inside the circle is exact; past the half-globe everything is in
+            if len(rows) >= k or radius >= np.pi * EARTH_RADIUS_MILES:
+                break
+            radius *= 2
+        if len(rows) < k:
+            rows = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+            dist = haversine_miles(lat, lon, self.lats[rows], self.lons[rows])
+        top = np.argsort(dist, kind="stable")[:k]
+        return rows[top], dist[top]
+
+    def pairs_within(self, lats, lons, radius_miles):
+        """
+        Every (query index, row id, distance) with distance <= radius for many query
+        points in one pass, sorted by query index then row id.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        empty = np.empty(0, dtype=np.int64)
+        if not len(lats) or not len(self):
+            return empty, empty, np.empty(0)
+
+        # cells to visit around each query cell (lon reach sized for the most poleward query)
+        reach_lat = int(np.ceil(radius_miles / MILES_PER_DEGREE_LAT / self.cell_deg))
+        widest = np.radians(min(np.abs(lats).max() + radius_miles / MILES_PER_DEGREE_LAT, 89.9))
+        reach_lon = int(np.ceil(radius_miles / (MILES_PER_DEGREE_LAT * np.cos(widest)) / self.cell_deg))
+
+        ilat = np.floor(lats / self.cell_deg)
+        ilon = np.floor(lons / self.cell_deg)
+        queries, rows = [], []
+        for dlat in range(-reach_lat, reach_lat + 1):
+            lo = np.searchsorted(self.keys, self._keys(ilat + dlat, ilon - reach_lon), side="left")
+            hi = np.searchsorted(self.keys, self._keys(ilat + dlat, ilon + reach_lon), side="right")
+            counts = hi - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            # expand each [lo, hi) slice without a Python loop over queries
+            starts = np.repeat(lo, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            queries.append(np.repeat(np.arange(len(lats)), counts))
+            rows.append(self.order[starts + offsets])
+        if not rows:
+            return empty, empty, np.empty(0)
+
+        queries = np.concatenate(queries)
+        rows = np.concatenate(rows)
+        dist = haversine_miles(lats[queries], lons[queries], self.lats[rows], self.lons[rows])
+        keep = dist <= radius_miles
+        queries, rows, dist = queries[keep], rows[keep], dist[keep]
+        order = np.lexsort((rows, queries))
+        return queries[order], rows[order], dist[order]
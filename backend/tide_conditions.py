@@ -1,7 +1,11 @@
+import os
+import threading
 import requests
+import numpy as np
 from datetime import datetime, timedelta, timezone
-from math import radians, cos, sin, sqrt, atan2
-from geopy.geocoders import Nominatim
+import geocoding
+from spatial import haversine_miles
+from upstream_stats import track
 
 # NOAA stations list
 NOAA_STATIONS = [
@@ -13,122 +17,329 @@ NOAA_STATIONS = [
     {"id": "8723214", "name": "West Palm Beach", "lat": 26.753, "lon": -80.056},
     # Add more stations as needed
 ]
-
-# Haversine distance
-def haversine(lat1, lon1, lat2, lon2):
-    R = 3958.8  # miles
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+_STATION_LAT = np.array([s["lat"] for s in NOAA_STATIONS])
+_STATION_LON = np.array([s["lon"] for s in NOAA_STATIONS])
 
 # Find nearest NOAA station
 def find_nearest_station(lat, lon):
-    return min(NOAA_STATIONS, key=lambda s: haversine(lat, lon, s["lat"], s["lon"]))
+    return NOAA_STATIONS[int(np.argmin(haversine_miles(lat, lon, _STATION_LAT, _STATION_LON)))]
 
 # Get beach coordinates
 def get_beach_coordinates(beach_name):
-    geolocator = Nominatim(user_agent="beach_tide_locator")
-    location = geolocator.geocode(beach_name)
+    location = geocoding.geocode(beach_name)
     if not location:
         raise ValueError(f"Could not find location for {beach_name}")
-    return location.latitude, location.longitude, location.address
+    return location
 
-# Fetch tide predictions
-def get_tide_prediction_json(lat, lon, beach_name):
-    # Find nearest NOAA station
-    station_info = find_nearest_station(lat, lon)
-    station_id = station_info["id"]
+# ----------------------
+# Station-level tide store
+# ----------------------
+NOAA_DATAGETTER_URL = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
 
-    url = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
+# Days of predictions pulled per station in one NOAA request
+TIDE_BLOCK_DAYS = int(os.environ.get("TIDE_BLOCK_DAYS", 7))
+
+# Window served by /tide-prediction, relative to now
+TIDE_WINDOW_BEFORE = timedelta(hours=4)
+TIDE_WINDOW_AFTER = timedelta(hours=8)
+
+
+def _to_epoch(dt):
+    return int(dt.timestamp())
 
-    now = datetime.now(timezone.utc)
-    start_filter = now - timedelta(hours=4)
-    end_filter = now + timedelta(hours=8)
 
-    begin_date = start_filter.strftime("%Y%m%d")
-    end_date = end_filter.strftime("%Y%m%d")
+def _from_epoch(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
 
-    # --- Hourly predictions ---
-    params_hourly = {
+
+def _parse_noaa_times(preds):
+    """NOAA 'YYYY-MM-DD HH:MM' (GMT) strings -> int64 epoch seconds."""
+    stamps = np.array([p["t"].replace(" ", "T") for p in preds], dtype="datetime64[m]")
+    return stamps.astype("datetime64[s]").astype(np.int64)
+
+
+def _format_noaa_times(epochs):
+    """int64 epoch seconds -> NOAA style 'YYYY-MM-DD HH:MM' strings."""
+    stamps = np.datetime_as_string(epochs.astype("datetime64[s]"), unit="m")
+    return [t.replace("T", " ") for t in stamps]
+
+
+def fetch_station_predictions(station_id, begin_date, end_date, interval):
+    params = {
         "station": station_id,
         "product": "predictions",
         "datum": "MLLW",
         "units": "english",
         "time_zone": "gmt",
         "format": "json",
-        "interval": "h",
-        "begin_date": begin_date,
-        "end_date": end_date
+        "interval": interval,
+        "begin_date": begin_date.strftime("%Y%m%d"),
+        "end_date": end_date.strftime("%Y%m%d")
     }
+    with track("noaa tide predictions"):
+        resp = requests.get(NOAA_DATAGETTER_URL, params=params, timeout=30)
+        resp.raise_for_status()
+    return resp.json().get("predictions", [])
 
-    resp_hourly = requests.get(url, params=params_hourly)
-    resp_hourly.raise_for_status()
-    hourly_preds = resp_hourly.json().get("predictions", [])
 
-    filtered_hourly = [
-        {"time": p["t"], "height": float(p["v"])}
-        for p in hourly_preds
-        if start_filter <= datetime.strptime(p["t"], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc) <= end_filter
-    ]
+# Longest range a single tides query may span
+TIDE_MAX_RANGE = timedelta(days=31)
+
+# Predictions are stored at NOAA's finest interval (6 minutes); hourly points are
+# the on-the-hour samples of that series
+TIDE_INTERVALS = ("6m", "h", "hilo")
+
 
-    # --- Generate synthetic past values ---
-    if len(filtered_hourly) >= 2:
-        first_val = filtered_hourly[0]["height"]
-        second_val = filtered_hourly[1]["height"]
-        rising = second_val > first_val
-
-        step = abs(second_val - first_val)  # change per hour
-        # If change is too small, give a small default
-        step = step if step > 0.01 else 0.05
-
-        synthetic_points = []
-        for i in range(4, 0, -1):
-            ts = (datetime.strptime(filtered_hourly[0]["time"], "%Y-%m-%d %H:%M") - timedelta(hours=i))
-            if rising:
-                # Go backwards, so values decrease as we move earlier
-                val = first_val - step * (4 - i + 1)
+class TideStationStore:
+    """
+    Keeps a multi-day block of NOAA predictions per station as numpy arrays,
+    so every beach near the station is served by slicing locally instead of
+    asking NOAA for a fresh 12 hour window.
+    """
+
+    def __init__(self, block_days=TIDE_BLOCK_DAYS):
+        self.block_days = block_days
+        self._blocks = {}  # station_id -> block dict (see _fetch_block); replaced, never mutated
+        self._station_locks = {}  # station_id -> Lock held while that station's block is fetched
+        self._lock = threading.Lock()  # guards _station_locks only, never held across a fetch
+
+    def _station_lock(self, station_id):
+        with self._lock:
+            return self._station_locks.setdefault(station_id, threading.Lock())
+
+    def _fetch_block(self, station_id, start, end):
+        begin_date = start.date()
+        end_date = max(end.date(), begin_date + timedelta(days=self.block_days - 1))
+
+        six_min = fetch_station_predictions(station_id, begin_date, end_date, "6")
+        hilo = fetch_station_predictions(station_id, begin_date, end_date, "hilo")
+
+        begin = datetime.combine(begin_date, datetime.min.time(), tzinfo=timezone.utc)
+        finish = datetime.combine(end_date + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        return {
+            "start": _to_epoch(begin),
+            "end": _to_epoch(finish),
+            "times": _parse_noaa_times(six_min),
+            "heights": np.array([float(p["v"]) for p in six_min], dtype=np.float32),
+            "hilo_times": _parse_noaa_times(hilo),
+            "hilo_heights": np.array([float(p["v"]) for p in hilo], dtype=np.float32),
+            # True = high tide, False = low tide
+            "hilo_high": np.array([p["type"].upper() == "H" for p in hilo], dtype=bool),
+        }
+
+    @staticmethod
+    def _merge(old, new):
+        """Join two blocks that overlap or touch into one contiguous block."""
+        merged = {"start": min(old["start"], new["start"]), "end": max(old["end"], new["end"])}
+        for times_key, value_keys in (("times", ("heights",)), ("hilo_times", ("hilo_heights", "hilo_high"))):
+            times, keep = np.unique(np.concatenate([new[times_key], old[times_key]]), return_index=True)
+            merged[times_key] = times
+            for key in value_keys:
+                merged[key] = np.concatenate([new[key], old[key]])[keep]
+        return merged
+
+    def get_block(self, station_id, start, end, cached_only=False):
+        """
+        Return the cached block for a station, fetching whatever part of [start, end] it lacks.
+        With cached_only, a block that doesn't cover [start, end] returns None instead.
+        """
+        lo, hi = _to_epoch(start), _to_epoch(end)
+        block = self._blocks.get(station_id)
+        if block is not None and block["start"] <= lo and hi <= block["end"]:
+            return block
+        if cached_only:
+            return None
+
+        # One fetch per station at a time; other stations are served meanwhile
+        with self._station_lock(station_id):
+            block = self._blocks.get(station_id)  # may have been fetched while we waited
+            if block is not None and block["start"] <= lo and hi <= block["end"]:
+                return block
+
+            extendable = (
+                block is not None
+                and lo <= block["end"] and block["start"] <= hi
+                and max(hi, block["end"]) - min(lo, block["start"]) <= 2 * TIDE_MAX_RANGE.total_seconds()
+            )
+            if extendable:
+                # Only fetch the missing edges and stitch them on
+                if lo < block["start"]:
+                    edge = self._fetch_block(station_id, start, _from_epoch(block["start"]))
+                    block = self._merge(block, edge)
+                if hi > block["end"]:
+                    edge = self._fetch_block(station_id, _from_epoch(block["end"]), end)
+                    block = self._merge(block, edge)
             else:
-                # Go backwards, so values increase as we move earlier
-                val = first_val + step * (4 - i + 1)
-            synthetic_points.append({
-                "time": ts.strftime("%Y-%m-%d %H:%M"),
-                "height": round(val, 3)
-            })
+                block = self._fetch_block(station_id, start, end)
+            self._blocks[station_id] = block
+            return block
+
+    def invalidate(self, station_id):
+        with self._station_lock(station_id):
+            self._blocks.pop(station_id, None)
 
-        filtered_hourly = synthetic_points + filtered_hourly
+
+def _slice(times, start, end):
+    lo = np.searchsorted(times, _to_epoch(start), side="left")
+    hi = np.searchsorted(times, _to_epoch(end), side="right")
+    return lo, hi
+
+
+def _hourly(times, heights):
+    on_the_hour = times % 3600 == 0
+    return times[on_the_hour], heights[on_the_hour]
+
+
+tide_store = TideStationStore()
+
+
+# Fetch tide predictions
+def get_tide_prediction_json(lat, lon, beach_name):
+    # Find nearest NOAA station
+    station_info = find_nearest_station(lat, lon)
+    station_id = station_info["id"]
+
+    now = datetime.now(timezone.utc)
+    start_filter = now - TIDE_WINDOW_BEFORE
+    end_filter = now + TIDE_WINDOW_AFTER
+
+    # Look a day ahead so the next high and low tide are always in the block
+    block = tide_store.get_block(station_id, start_filter, now + timedelta(days=1))
+
+    # --- Hourly predictions, sliced from the station block ---
+    times, heights = _hourly(block["times"], block["heights"])
+    lo, hi = _slice(times, start_filter, end_filter)
+    filtered_hourly = [
+        {"time": t, "height": round(float(h), 3)}
+        for t, h in zip(_format_noaa_times(times[lo:hi]), heights[lo:hi])
+    ]
 
     # --- High/Low tides ---
-    params_hilo = {
-        "station": station_id,
-        "product": "predictions",
-        "datum": "MLLW",
-        "units": "english",
-        "time_zone": "gmt",
-        "format": "json",
-        "interval": "hilo",
-        "begin_date": begin_date,
-        "end_date": end_date
+    hilo_times = block["hilo_times"]
+    upcoming = np.searchsorted(hilo_times, _to_epoch(now), side="left")
+    high_tide = low_tide = None
+    for i in range(upcoming, len(hilo_times)):
+        point = {
+            "time": _format_noaa_times(hilo_times[i:i + 1])[0],
+            "height": round(float(block["hilo_heights"][i]), 3)
+        }
+        if block["hilo_high"][i]:
+            high_tide = high_tide or point
+        else:
+            low_tide = low_tide or point
+        if high_tide and low_tide:
+            break
+
+    return {
+        "beach_name": beach_name,
+        "station_id": station_id,
+        "station_name": station_info["name"],
+        "low_tide": low_tide,
+        "high_tide": high_tide,
+        "tides": filtered_hourly
     }
-    resp_hilo = requests.get(url, params=params_hilo)
-    resp_hilo.raise_for_status()
-    hilo_preds = resp_hilo.json().get("predictions", [])
 
-    high_tide = next(
-        (p for p in hilo_preds if datetime.strptime(p["t"], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc) >= now and p["type"].lower() == "h"),
-        None
-    )
-    low_tide = next(
-        (p for p in hilo_preds if datetime.strptime(p["t"], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc) >= now and p["type"].lower() == "l"),
-        None
+
+def tide_heights_at(lat, lon, epochs, cached_only=False):
+    """
+    Predicted height (ft, MLLW) at each epoch second and whether the tide is
+    rising there, interpolated from the nearest station's 6-minute block.
+    With cached_only, returns None when the station block isn't cached.
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    station_id = find_nearest_station(lat, lon)["id"]
+    block = tide_store.get_block(
+        station_id, _from_epoch(int(epochs.min())), _from_epoch(int(epochs.max()) + 360), cached_only=cached_only
     )
+    if block is None:
+        return None
+    heights = np.interp(epochs, block["times"], block["heights"])
+    rising = np.interp(epochs + 360, block["times"], block["heights"]) > heights
+    return heights, rising
+
+
+# ----------------------
+# Downsampling
+# ----------------------
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: pick `threshold` indices that keep the
+    visual shape of the (x, y) series. Turning points (highs and lows) are
+    always kept on top of that, so the result can be slightly longer.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    picked[-1] = n - 1
+
+    slope = np.sign(np.diff(y))
+    turning = np.nonzero(slope[1:] != slope[:-1])[0] + 1
+    return np.union1d(picked, turning)
+
+
+# ----------------------
+# Arbitrary tide windows
+# ----------------------
+def get_tide_series(lat, lon, start, end, interval="h", max_points=None):
+    if interval not in TIDE_INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(TIDE_INTERVALS)}")
+    if end <= start:
+        raise ValueError("'to' must be after 'from'")
+    if end - start > TIDE_MAX_RANGE:
+        raise ValueError(f"Range may not exceed {TIDE_MAX_RANGE.days} days")
+
+    station_info = find_nearest_station(lat, lon)
+    station_id = station_info["id"]
+    block = tide_store.get_block(station_id, start, end)
+
+    if interval == "hilo":
+        lo, hi = _slice(block["hilo_times"], start, end)
+        tides = [
+            {"time": t, "height": round(float(h), 3), "type": "H" if high else "L"}
+            for t, h, high in zip(
+                _format_noaa_times(block["hilo_times"][lo:hi]),
+                block["hilo_heights"][lo:hi],
+                block["hilo_high"][lo:hi]
+            )
+        ]
+    else:
+        times, heights = block["times"], block["heights"]
+        if interval == "h":
+            times, heights = _hourly(times, heights)
+        lo, hi = _slice(times, start, end)
+        times, heights = times[lo:hi], heights[lo:hi]
+        if max_points:
+            keep = lttb_indices(times, heights, max_points)
+            times, heights = times[keep], heights[keep]
+        tides = [
+            {"time": t, "height": round(float(h), 3)}
+            for t, h in zip(_format_noaa_times(times), heights)
+        ]
 
     return {
-        "beach_name": beach_name,
         "station_id": station_id,
         "station_name": station_info["name"],
-        "low_tide": {"time": low_tide["t"], "height": float(low_tide["v"])} if low_tide else None,
-        "high_tide": {"time": high_tide["t"], "height": float(high_tide["v"])} if high_tide else None,
-        "tides": filtered_hourly
-    }
\ No newline at end of file
+        "interval": interval,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "count": len(tides),
+        "tides": tides
+    }
@@ -0,0 +1,45 @@
+# Bookkeeping for calls to external APIs (Open-Meteo, NOAA, ...): running
+# totals per upstream plus the list of calls made while serving the current request
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_totals = {}  # name -> {'calls': int, 'errors': int, 'seconds': float}
+_local = threading.local()
+
+
+@contextmanager
+def track(name):
+    """Time one upstream call and record it under `name`."""
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            entry = _totals.setdefault(name, {'calls': 0, 'errors': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['errors'] += int(failed)
+            entry['seconds'] += elapsed
+        calls = getattr(_local, 'calls', None)
+        if calls is not None:
+            calls.append((name, elapsed))
+
+
+def begin_request():
+    _local.calls = []
+
+
+def end_request():
+    """Return the (name, seconds) calls made since begin_request() on this thread."""
+    calls = getattr(_local, 'calls', None) or []
+    _local.calls = None
+    return calls
+
+
+def totals():
+    with _lock:
+        return {name: dict(entry) for name, entry in _totals.items()}
@@ -1,2 +1,10 @@
-from app import app as application
+import gc
+
+from app import app as application, warm
+
+# With gunicorn's preload_app (gunicorn.conf.py) this runs once in the master
+warm()
+# Keep the collector from touching, and so un-sharing, the preloaded objects in each worker
+gc.freeze()
+
 app = application
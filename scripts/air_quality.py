@@ -1,12 +1,17 @@
+import os
+import sys
+
 import openmeteo_requests
 
 import pandas as pd
-import requests_cache
 from retry_requests import retry
 
+# shared HTTP response cache (size cap, purge) from the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from http_cache import get_session
+
 # Setup the Open-Meteo API client with cache and retry on error
-cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
+retry_session = retry(get_session(), retries = 5, backoff_factor = 0.2)
 openmeteo = openmeteo_requests.Client(session = retry_session)
 
 def classify_us_aqi_PM25(value):
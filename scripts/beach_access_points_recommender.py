@@ -1,18 +1,22 @@
-from geopy.geocoders import Nominatim
+import os
+import sys
 from geopy.distance import geodesic
 import pandas as pd
 
+# shared, cached + rate-limited geocoding from the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import geocoding
+
 # ----------------------
 # Get lat/lon of a beach
 # ----------------------
 def get_beach_location(beach_name):
-    geolocator = Nominatim(user_agent="beach_name_locator")
-    beach_location = geolocator.geocode(beach_name)
+    beach_location = geocoding.geocode(beach_name)
 
     if not beach_location:
         raise ValueError(f"Could not find location for {beach_name}")
 
-    return beach_location.latitude, beach_location.longitude, beach_location.address
+    return beach_location
 
 # ----------------------
 # Convert miles to walking time (minutes)
@@ -114,12 +118,11 @@ def main():
     top_recommendations = rank_access_points(beach_lat, beach_lon, beach_access_points)
 
     # Print results
-    geolocator = Nominatim(user_agent="beach_name_locator")
     print("\nTop 5 Beach Access Point Recommendations:")
     for i, (coord, (score, dist, fee)) in enumerate(top_recommendations.items(), start=1):
         try:
-            location = geolocator.reverse(coord)
-            address = location.address if location else "Unknown location"
+            lat, lon = coord.split(", ")
+            address = geocoding.reverse(lat, lon) or "Unknown location"
         except:
             address = "Unknown location"
 
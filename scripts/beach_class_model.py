@@ -1,18 +1,22 @@
 #This is the hourly beach forecast model that pulls in data from Open-Meteo API
 
+import os
+import sys
 import openmeteo_requests
 import pandas as pd
-import requests_cache
 from retry_requests import retry
 from datetime import datetime
 
+# shared HTTP response cache (size cap, purge) from the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from http_cache import get_session
+
 
 #add lighstning data later
 
 #Pull in data from Open-Meteo API
 # Setup the Open-Meteo API client with cache and retry on error
-cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
+retry_session = retry(get_session(), retries=5, backoff_factor=0.2)
 openmeteo = openmeteo_requests.Client(session=retry_session)
 # Make sure all required weather variables are listed here
 url = "https://api.open-meteo.com/v1/forecast"
@@ -0,0 +1,100 @@
+#Cold-start benchmark for the backend. Imports a backend module (default: app, what every
+#gunicorn worker loads) in fresh interpreters under `python -X importtime`, reports where
+#the time goes per top-level package, and exits non-zero when a library that is meant to
+#load lazily shows up at import, or when the import is slower than --budget-ms.
+#The default (`import app`) needs the full backend requirements installed (flask-cors, supabase,
+#python-dotenv, ...: pip install -r backend/requirements.txt); otherwise pass -m for modules
+#that import without them. CI runs it in .github/workflows/backend-startup.yml; the exit code is the check.
+#   python scripts/bench_startup.py
+#   python scripts/bench_startup.py -m red_tide -m beach_access_points --budget-ms 400
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+# loaded on first use by the code that needs them, never by importing the backend
+LAZY_MODULES = ("pandas", "geopy", "bs4", "requests_cache", "openmeteo_requests", "retry_requests")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def import_profile(module):
+    """
+    One cold import of `module`: {imported module: (self_us, cumulative_us)} for the
+    modules it pulled in (interpreter startup imports are left out).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        last = (result.stderr.strip().splitlines() or ["(no output)"])[-1]
+        raise RuntimeError(f"import {module} failed: {last}")
+
+    # entries are printed children first, so `module`'s subtree is the run of
+    # lines since the previous top-level entry
+    times = {}
+    for line in result.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        times[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+        if not m.group(3) and m.group(4) != module:
+            times = {}
+    return times
+
+
+def by_package(times):
+    """Self time summed per top-level package, slowest first (ms)."""
+    totals = {}
+    for name, (self_us, _) in times.items():
+        root = name.split(".")[0]
+        totals[root] = totals.get(root, 0) + self_us / 1000
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def eager_lazy_modules(times):
+    return sorted({name.split(".")[0] for name in times if name.split(".")[0] in LAZY_MODULES})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import time with python -X importtime")
+    parser.add_argument("-m", "--module", action="append", help="backend module to import (repeatable, default: app)")
+    parser.add_argument("--runs", type=int, default=5, help="cold imports per module; the median is reported")
+    parser.add_argument("--top", type=int, default=12, help="packages to list per module")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if a median import takes longer")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.module or ["app"]:
+        try:
+            runs = [import_profile(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(e)
+            failed = True
+            continue
+
+        totals = [times[module][1] / 1000 for times in runs]
+        median = statistics.median(totals)
+        fastest = runs[totals.index(min(totals))]
+        print(f"import {module}: median {median:.1f} ms, best {min(totals):.1f} ms over {args.runs} runs")
+        for package, ms in by_package(fastest)[:args.top]:
+            print(f"  {package:<28} {ms:8.1f} ms")
+
+        eager = eager_lazy_modules(fastest)
+        if eager:
+            print(f"  FAIL: imported at startup but should load lazily: {', '.join(eager)}")
+            failed = True
+        if args.budget_ms is not None and median > args.budget_ms:
+            print(f"  FAIL: {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
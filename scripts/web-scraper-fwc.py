@@ -1,27 +1,27 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pdfplumber
 import requests
 from bs4 import BeautifulSoup
-import pdfplumber
-import pandas as pd
-from io import BytesIO
 
 base_url = "https://myfwc.com"
 reports_page = "https://myfwc.com/research/redtide/statewide/"
 
-# Fetch the statewide red tide page
-response = requests.get(reports_page)
-response.raise_for_status()
-soup = BeautifulSoup(response.text, "html.parser")
-
-# Find all report links that end with .pdf
-pdf_links = []
-for link in soup.find_all("a", href=True):
-    href = link["href"]
-    if href.lower().endswith(".pdf"):
-        if href.startswith("/"):
-            href = base_url + href
-        pdf_links.append(href)
-pdf_links = pdf_links[:3]  # take first 3 PDFs
-print("Found PDF links:", pdf_links)
+HERE = os.path.dirname(os.path.abspath(__file__))
+# report URL -> {sha256, etag, last_modified, rows, output, processed_at, error, failed_at}
+MANIFEST_PATH = os.path.join(HERE, "fwc_reports_manifest.json")
+PDF_DIR = os.path.join(HERE, "fwc_pdfs")
+# one columnar file per report; read the whole history with pd.read_parquet(OUTPUT_DIR)
+OUTPUT_DIR = os.path.join(HERE, "fwc_reports")
+PAGES_PER_TASK = 4
+
 
 def make_unique(columns):
     """Make duplicate column names unique by appending _1, _2, etc."""
@@ -37,50 +37,225 @@ def make_unique(columns):
             new_cols.append(col_str)
     return new_cols
 
-all_tables = []
 
-for url in pdf_links:
-    response = requests.get(url)
+def clean_table(table):
+    """Raw pdfplumber table -> DataFrame with a header row and only rows holding numbers."""
+    df = pd.DataFrame(table)
+    df.dropna(how="all", inplace=True)
+    if df.empty:
+        return None
+
+    # Make first row the header
+    df.columns = make_unique(df.iloc[0])
+    df = df[1:].reset_index(drop=True)
+
+    # Keep rows that contain numeric data: one vectorized digit test per column
+    has_digit = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        has_digit |= df[col].astype("string").str.contains(r"\d", regex=True, na=False).to_numpy()
+    df = df[has_digit]
+
+    # Remove fully blank columns
+    df = df.dropna(axis=1, how="all")
+    return df if not df.empty else None
+
+
+def extract_pages(task):
+    """Process-pool worker: cleaned tables for a few pages of one PDF on disk."""
+    pdf_path, page_numbers, source_name = task
+    frames = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in page_numbers:
+            for table in pdf.pages[page_num - 1].extract_tables():
+                df = clean_table(table)
+                if df is not None:
+                    df["Page"] = page_num
+                    df["Source"] = source_name
+                    frames.append(df)
+    return frames
+
+
+def find_pdf_links():
+    response = requests.get(reports_page, timeout=60)
     response.raise_for_status()
+    soup = BeautifulSoup(response.text, "html.parser")
 
-    source_name = url.split("/")[-1].replace(".pdf", "")
-    with pdfplumber.open(BytesIO(response.content)) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            tables = page.extract_tables()
-            for table in tables:
-                df = pd.DataFrame(table)
+    # Find all report links that end with .pdf
+    pdf_links = []
+    for link in soup.find_all("a", href=True):
+        href = link["href"]
+        if href.lower().endswith(".pdf"):
+            if href.startswith("/"):
+                href = base_url + href
+            if href not in pdf_links:
+                pdf_links.append(href)
+    return pdf_links
 
-                # --- CLEANUP START ---
-                df.dropna(how="all", inplace=True)
-                if df.empty:
-                    continue
 
-                # Make first row the header
-                df.columns = df.iloc[0]
-                df = df[1:].reset_index(drop=True)
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-                # Deduplicate column names
-                df.columns = make_unique(df.columns)
 
-                # Keep rows that contain numeric data
-                df = df[df.apply(lambda row: any(
-                    isinstance(cell, str) and any(c.isdigit() for c in cell) or isinstance(cell, (int, float))
-                    for cell in row
-                ), axis=1)]
+def save_manifest(manifest):
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
 
-                # Remove fully blank columns
-                df.dropna(axis=1, how="all", inplace=True)
 
-                if not df.empty:
-                    df["Page"] = page_num
-                    df["Source"] = source_name
-                    all_tables.append(df)
-                # --- CLEANUP END ---
-
-# Combine all cleaned tables
-if all_tables:
-    final_df = pd.concat(all_tables, ignore_index=True)
-    print(final_df.head())
-    final_df.to_csv("fwc1_reports_cleaned.csv", index=False)
-else:
-    print("No valid tables found in PDFs.")
\ No newline at end of file
+def download(url, entry):
+    """
+    (content, headers) for a changed report, None when the server/manifest says it's
+    unchanged, or the exception when the download failed (so one report can't stop the run).
+    """
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        response = requests.get(url, headers=headers, timeout=120)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+    except requests.RequestException as e:
+        return e
+    return response.content, response.headers
+
+
+def record_failure(manifest, url, error):
+    """Keep the report's last good output; note the error so the next run retries it."""
+    manifest.setdefault(url, {}).update({
+        "error": f"{type(error).__name__}: {error}",
+        "failed_at": datetime.now(timezone.utc).isoformat(),
+    })
+    print(f"{url}: failed ({error})")
+
+
+def write_report(df, source_name, digest):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    df = df.astype("string")  # PDF cells are text; keeps the schema stable across reports
+    df["Page"] = df["Page"].astype("int32")
+    try:
+        path = os.path.join(OUTPUT_DIR, f"{source_name}-{digest[:12]}.parquet")
+        df.to_parquet(path, index=False)
+    except ImportError:
+        # no pyarrow/fastparquet installed: fall back to compressed CSV
+        path = os.path.join(OUTPUT_DIR, f"{source_name}-{digest[:12]}.csv.gz")
+        df.to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally extract FWC red tide PDF report tables")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N report links")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="page extraction processes")
+    parser.add_argument("--force", action="store_true", help="reprocess reports even if unchanged")
+    args = parser.parse_args()
+
+    pdf_links = find_pdf_links()[:args.limit]
+    print(f"Found {len(pdf_links)} PDF links")
+
+    # --force ignores the stored validators and hashes, but still updates entries in
+    # place so reports outside this run keep theirs
+    manifest = load_manifest()
+    os.makedirs(PDF_DIR, exist_ok=True)
+
+    # Downloads are I/O bound: fetch in threads, conditional on ETag/Last-Modified
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        downloads = list(pool.map(lambda url: download(url, {} if args.force else manifest.get(url, {})), pdf_links))
+
+    reports = []
+    failed = 0
+    for url, result in zip(pdf_links, downloads):
+        if result is None:
+            # unchanged since the last good download; an earlier failure no longer applies
+            for key in ("error", "failed_at"):
+                manifest.get(url, {}).pop(key, None)
+            continue
+        if isinstance(result, Exception):
+            record_failure(manifest, url, result)
+            failed += 1
+            continue
+        content, headers = result
+        digest = hashlib.sha256(content).hexdigest()
+        entry = manifest.setdefault(url, {})
+        entry.update({"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")})
+        if entry.get("sha256") == digest and not args.force:
+            entry.pop("error", None)
+            entry.pop("failed_at", None)
+            continue  # same bytes as last time
+        pdf_path = os.path.join(PDF_DIR, f"{digest}.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(content)
+        reports.append((url, digest, pdf_path, url.split("/")[-1].replace(".pdf", "")))
+
+    skipped = len(pdf_links) - len(reports) - failed
+    print(f"{len(reports)} new or changed reports, {skipped} unchanged, {failed} failed to download")
+
+    # Table extraction is CPU bound: fan pages out over processes
+    tasks, owners = [], []
+    errors = [None] * len(reports)
+    for i, (_, _, pdf_path, source_name) in enumerate(reports):
+        try:
+            with pdfplumber.open(pdf_path) as pdf:
+                n_pages = len(pdf.pages)
+        except Exception as e:
+            errors[i] = e  # not a readable PDF
+            continue
+        for start in range(1, n_pages + 1, PAGES_PER_TASK):
+            tasks.append((pdf_path, list(range(start, min(start + PAGES_PER_TASK, n_pages + 1))), source_name))
+            owners.append(i)
+
+    frames = [[] for _ in reports]
+    if tasks:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(extract_pages, task) for task in tasks]
+            for i, future in zip(owners, futures):
+                try:
+                    frames[i].extend(future.result())
+                except Exception as e:
+                    errors[i] = errors[i] or e
+
+    total = processed = 0
+    for (url, digest, pdf_path, source_name), report_frames, error in zip(reports, frames, errors):
+        if error is not None:
+            # sha256 is left as it was and the validators dropped, so the next run
+            # downloads and extracts the report again
+            record_failure(manifest, url, error)
+            manifest[url].pop("etag", None)
+            manifest[url].pop("last_modified", None)
+            os.remove(pdf_path)
+            failed += 1
+            continue
+        rows = 0
+        output = None
+        if report_frames:
+            df = pd.concat(report_frames, ignore_index=True)
+            output = write_report(df, source_name, digest)
+            rows = len(df)
+        previous = manifest[url].get("output")
+        if previous and os.path.join(HERE, previous) != output and os.path.exists(os.path.join(HERE, previous)):
+            os.remove(os.path.join(HERE, previous))  # the report was revised; drop its old rows
+        manifest[url].update({
+            "sha256": digest,
+            "rows": rows,
+            "output": os.path.relpath(output, HERE) if output else None,
+            "processed_at": datetime.now(timezone.utc).isoformat(),
+        })
+        manifest[url].pop("error", None)
+        manifest[url].pop("failed_at", None)
+        os.remove(pdf_path)
+        total += rows
+        processed += 1
+        print(f"{source_name}: {rows} rows")
+
+    save_manifest(manifest)
+    print(f"Done: {total} rows from {processed} reports, {failed} failed -> {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()